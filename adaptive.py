@@ -0,0 +1,112 @@
+"""
+Simulate until the results are precise enough, instead of a fixed nr of games.
+
+play_until_precise stops once the confidence interval of the mean score is
+narrow enough. compare_lineups plays two lineups side by side and stops as
+soon as one of them is significantly better, by default with common random
+numbers for both lineups.
+"""
+import numpy as np
+from batch import BatchGame
+from stats import ScoreStats, z_value
+
+
+def play_batch(lineup, nr_games, rng, stats):
+    batch = BatchGame(lineup, nr_games, rng=rng)
+    batch.play()
+    stats.add_scores(batch.get_scores())
+
+
+def play_until_precise(lineup, target_stderr, confidence=None, batch_size=10_000,
+                       max_games=100_000_000, rng=None, progress=False):
+    """
+    Plays batches of games until the mean score is known precisely enough.
+    :param target_stderr: stop when the half-width of the confidence interval
+                            of the mean is at most this
+    :param confidence: e.g. 0.95, if None the standard error itself is used
+    :param batch_size: games per batch, played with BatchGame
+    :param max_games: stop here, also when not precise enough
+    :return: ScoreStats, its nr_games is the number of games that were needed
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    z = z_value(confidence)
+    stats = ScoreStats()
+    while stats.nr_games < max_games:
+        nr_games = min(batch_size, max_games - stats.nr_games)
+        play_batch(lineup, nr_games, rng, stats)
+        if progress:
+            print(f"Played {stats.nr_games} games, mean {stats.mean():.4f} +- {z * stats.stderr():.4f}")
+        if z * stats.stderr() <= target_stderr:
+            break
+    return stats
+
+
+def play_paired(lineup_a, lineup_b, nr_games, seed, antithetic=False):
+    """
+    Plays both lineups with common random numbers: game i of both lineups
+    sees the same random numbers.
+    :param antithetic: also play both with the antithetic numbers, and
+                        average each game with its antithetic twin
+    :return: array with the score of a minus the score of b, per game (pair)
+    """
+    differences = np.zeros(nr_games)
+    for flip in ((False, True) if antithetic else (False,)):
+        for lineup, sign in ((lineup_a, 1), (lineup_b, -1)):
+            batch = BatchGame(lineup, nr_games, crn_seed=seed, antithetic=flip)
+            batch.play()
+            differences += sign * batch.get_scores()
+    return differences / (2 if antithetic else 1)
+
+
+def compare_lineups(lineup_a, lineup_b, confidence=0.95, batch_size=10_000,
+                    max_games=10_000_000, rng=None, progress=False,
+                    common_random_numbers=True, antithetic=False):
+    """
+    Plays both lineups batch by batch, and stops as soon as the difference of
+    their mean scores is significant. Looking at the data after every batch is
+    paid for by testing the k-th look at level alpha * 6 / (pi^2 k^2), which
+    adds up to alpha over all looks.
+    :param confidence: 1 - alpha
+    :param max_games: per lineup, stop without a winner after that many
+    :param common_random_numbers: feed the same random numbers to both lineups,
+                        which makes the difference much less noisy
+    :param antithetic: with common_random_numbers, pair every game with its
+                        antithetic twin
+    :return: dict with the winner ('a', 'b' or None), the difference in mean
+                score (a - b), its standard error, and the games per lineup
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    alpha = 1 - confidence
+    games_per_sample = 2 if common_random_numbers and antithetic else 1
+    stats_a, stats_b = ScoreStats(), ScoreStats()
+    # sums of the paired differences, with common random numbers
+    nr_pairs, sum_diff, sum_sq_diff = 0, 0.0, 0.0
+    winner = None
+    look = 0
+    nr_games = 0
+    while nr_games < max_games:
+        batch_games = min(batch_size, (max_games - nr_games) // games_per_sample) or 1
+        if common_random_numbers:
+            seed = int(rng.integers(2 ** 63))
+            differences = play_paired(lineup_a, lineup_b, batch_games, seed, antithetic)
+            nr_pairs += len(differences)
+            sum_diff += differences.sum()
+            sum_sq_diff += (differences ** 2).sum()
+            difference = sum_diff / nr_pairs
+            variance = (sum_sq_diff - nr_pairs * difference ** 2) / max(nr_pairs - 1, 1)
+            stderr = np.sqrt(max(variance, 0.0) / nr_pairs)
+        else:
+            play_batch(lineup_a, batch_games, rng, stats_a)
+            play_batch(lineup_b, batch_games, rng, stats_b)
+            difference = stats_a.mean() - stats_b.mean()
+            stderr = np.sqrt(stats_a.stderr() ** 2 + stats_b.stderr() ** 2)
+        nr_games += batch_games * games_per_sample
+        look += 1
+        z = z_value(1 - alpha * 6 / (np.pi ** 2 * look ** 2))
+        if progress:
+            print(f"Played {nr_games} games each, difference {difference:.4f} +- {z * stderr:.4f}")
+        if abs(difference) > z * stderr:
+            winner = 'a' if difference > 0 else 'b'
+            break
+    return {'winner': winner, 'difference': float(difference), 'stderr': float(stderr),
+            'nr_games': nr_games}
@@ -2,11 +2,18 @@
 Python script to simulate the offense side of a baseball game,
 such that we can compare different lineup possibilities.
 """
+from bisect import bisect_right
+from time import perf_counter
 import numpy as np
+import eventlog
+import profiling
+from batter import SWING_BLOCK_SIZE
+import transitions
+from transitions import EMPTY, NO_RUNNER, NR_EVENTS, NR_STATES, STEAL, runner_combo, state_index
 
 
 class Game:
-    def __init__(self, lineup, nr_innings=9, printing=False,
+    def __init__(self, lineup, nr_innings=9, printing=False, rng=None, recorder=None, profile=None,
                  prob_advance_runner_on_out=0.2,
                  prob_double_play=0.4,
                  prob_steal_2nd_base=0.05,
@@ -18,8 +25,20 @@ class Game:
         self.lineup = lineup
         self.nr_innings = nr_innings
         self.printing = printing
+        self.rng = np.random.default_rng() if rng is None else rng
+        # optional eventlog.EventRecorder
+        self.recorder = recorder
+        # optional profiling.GameProfile
+        self.profile = profile
+        self.game_nr = -1
+        self.inning = 0
+        # over all games played with this Game
+        self.nr_plate_appearances = 0
         self.game_state = {}
         self.reset_game_state()
+        # pre-drawn swings of every lineup slot, from self.rng, see next_swing
+        self.swings = [[] for _ in lineup]
+        self.swing_block_sizes = [64] * len(lineup)
 
         self.prob_advance_runner_on_out = prob_advance_runner_on_out
         self.prob_double_play = prob_double_play
@@ -32,18 +51,42 @@ class Game:
         self.prob_score_from_2nd_on_single = prob_score_from_2nd_on_single
         self.prob_score_from_1st_on_double = prob_score_from_1st_on_double
 
+        # table[event][outs][bases] = (cumulative probs, branches)
+        self.table = transitions.get_table(self.get_params())
+        # only when some batters run the bases with their own probabilities
+        self.runner_cum_probs = None
+        if any(batter.baserunning for batter in lineup):
+            assert len(lineup) <= NO_RUNNER
+            self.runner_cum_probs = transitions.get_runner_cum_probs(lineup, self.get_params(), as_lists=True)
+            self.advance = self.advance_runners
+        if printing or recorder is not None:
+            # so that a game without tracing does not pay for it at every event
+            self.advance = self.advance_traced
+        if profile is not None:
+            # wraps the advance chosen above
+            self.advance_unprofiled = self.advance
+            self.advance = self.advance_profiled
+            self.play_batter = self.play_batter_profiled
+
+    def get_params(self):
+        return {name: getattr(self, name) for name in transitions.PARAM_NAMES}
+
     def reset_game_state(self):
-        self.game_state = {'score': 0, 'outs':  0, 'batter_up': 0,
-                           '1st_base': False, '2nd_base': False, '3rd_base': False}
+        # runners: lineup index of the runner on 1st, 2nd and 3rd, or NO_RUNNER,
+        # kept up to date by advance_runners and advance_traced (the plain
+        # advance does not need them)
+        self.game_state = {'score': 0, 'outs':  0, 'batter_up': 0, 'bases': EMPTY,
+                           'runners': [NO_RUNNER] * 3}
 
     def reset_inning_state(self):
-        self.game_state['1st_base'] = False
-        self.game_state['2nd_base'] = False
-        self.game_state['3rd_base'] = False
+        self.game_state['bases'] = EMPTY
         self.game_state['outs'] = 0
+        self.game_state['runners'] = [NO_RUNNER] * 3
 
     def play(self):
+        self.game_nr += 1
         for inning in range(self.nr_innings):
+            self.inning = inning
             if self.printing:
                 print(f"\nInning {inning+1}")
             self.play_inning()
@@ -56,306 +99,133 @@ class Game:
             self.next_batter()
 
     def play_batter(self):
-        batter = self.lineup[self.game_state['batter_up']]
-        if self.printing:
-            print(f"Now up: {batter.name}")
-        outcome = batter.swing()
+        self.nr_plate_appearances += 1
         # options = ["strike-out", "in-play-out", "walk", "single", "double", "triple", "homerun"]
-        if outcome == 'strike-out':
-            self.strike_out()
-        elif outcome == 'in-play-out':
-            self.in_play_out()
-        elif outcome == 'walk':
-            self.walk()
-        elif outcome == 'single':
-            self.single()
-        elif outcome == 'double':
-            self.double()
-        elif outcome == 'triple':
-            self.triple()
-        elif outcome == 'homerun':
-            self.homerun()
-
-    def strike_out(self):
-        if self.printing:
-            print("Strike-out.")
-        self.game_state['outs'] += 1
-
-    def in_play_out(self):
-        if self.printing:
-            print("Ball in play, out.")
-        self.game_state['outs'] += 1
-        runners = [self.game_state['1st_base'], self.game_state['2nd_base'], self.game_state['3rd_base']].count(True)
-        if runners > 0 and self.game_state['outs'] < 3:
-            coinflip = np.random.rand()
-            if coinflip < self.prob_advance_runner_on_out:
-                self.sac_fly_or_bunt()
-            elif coinflip < self.prob_advance_runner_on_out + self.prob_double_play:
-                self.double_play()
-
-    def walk(self):
-        if self.printing:
-            print("Walk.")
-        if self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            self.game_state['score'] += 1
-        elif self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            self.game_state['3rd_base'] = True
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base']:
-            self.game_state['2nd_base'] = True
-        elif not self.game_state['1st_base']:
-            self.game_state['1st_base'] = True
-
-    def single(self):
-        if self.printing:
-            print("Hits a single.")
-        if self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # bases loaded
-            self.game_state['score'] += 1
-            if np.random.rand() < self.prob_score_from_2nd_on_single:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-                if np.random.rand() < self.prob_1st_to_3rd:
-                    self.game_state['3rd_base'] = True
-                    self.game_state['2nd_base'] = False
-        elif self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st and 2nd
-            self.game_state['3rd_base'] = True
-            if np.random.rand() < self.prob_score_from_2nd_on_single:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-                if np.random.rand() < self.prob_1st_to_3rd:
-                    self.game_state['3rd_base'] = True
-                    self.game_state['2nd_base'] = False
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 1st and 3rd
-            self.game_state['score'] += 1
-            self.game_state['3rd_base'] = False
-            self.game_state['2nd_base'] = True
-            if np.random.rand() < self.prob_1st_to_3rd:
-                self.game_state['3rd_base'] = True
-                self.game_state['2nd_base'] = False
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st only
-            self.game_state['2nd_base'] = True
-            if np.random.rand() < self.prob_1st_to_3rd:
-                self.game_state['3rd_base'] = True
-                self.game_state['2nd_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 2nd and 3rd
-            self.game_state['1st_base'] = True
-            self.game_state['score'] += 1
-            self.game_state['2nd_base'] = False
-            if np.random.rand() < self.prob_score_from_2nd_on_single:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 2nd only
-            self.game_state['1st_base'] = True
-            self.game_state['2nd_base'] = False
-            self.game_state['3rd_base'] = True
-            if np.random.rand() < self.prob_score_from_2nd_on_single:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-        elif not self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 3rd only
-            self.game_state['1st_base'] = True
-            self.game_state['score'] += 1
-            self.game_state['3rd_base'] = False
+        self.advance(self.next_swing(self.game_state['batter_up']))
+
+    def next_swing(self, slot):
+        """
+        The outcome of the next swing of the batter in a lineup slot. They are
+        drawn a block at a time, blocks get bigger the more the Game is used,
+        up to SWING_BLOCK_SIZE.
+        """
+        swings = self.swings[slot]
+        if not swings:
+            size = self.swing_block_sizes[slot]
+            self.swing_block_sizes[slot] = min(2 * size, SWING_BLOCK_SIZE)
+            swings = self.swings[slot] = self.lineup[slot].draw_swings(self.rng, size)
+        return swings.pop()
+
+    def play_batter_profiled(self):
+        """ Same as play_batter, but counts (and sometimes times) the swing. """
+        self.nr_plate_appearances += 1
+        profile = self.profile
+        profile.nr_swings += 1
+        if profile.take_sample():
+            start = perf_counter()
+            code = self.next_swing(self.game_state['batter_up'])
+            profile.add_time(profiling.SWING, perf_counter() - start)
         else:
-            # bases empty
-            self.game_state['1st_base'] = True
+            code = self.next_swing(self.game_state['batter_up'])
+        self.advance(code)
 
-    def double(self):
-        if self.printing:
-            print("Hits a double!")
-        if self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # bases loaded
-            self.game_state['score'] += 2
-            self.game_state['1st_base'] = False
-            if np.random.rand() < self.prob_score_from_1st_on_double:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-        elif self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st and 2nd
-            self.game_state['1st_base'] = False
-            self.game_state['3rd_base'] = True
-            self.game_state['score'] += 1
-            if np.random.rand() < self.prob_score_from_1st_on_double:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 1st and 3rd
-            self.game_state['score'] += 1
-            self.game_state['1st_base'] = False
-            self.game_state['2nd_base'] = True
-            if np.random.rand() < self.prob_score_from_1st_on_double:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st only
-            self.game_state['1st_base'] = False
-            self.game_state['2nd_base'] = True
-            self.game_state['3rd_base'] = True
-            if np.random.rand() < self.prob_score_from_1st_on_double:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 2nd and 3rd
-            self.game_state['score'] += 2
-            self.game_state['3rd_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 2nd only
-            self.game_state['score'] += 1
-        elif not self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 3rd only
-            self.game_state['score'] += 1
-            self.game_state['2nd_base'] = True
-            self.game_state['3rd_base'] = False
+    def steal(self):
+        self.advance(STEAL)
+
+    def advance(self, event):
+        """
+        Plays one event from the transition table: picks one of its branches
+        and moves to the next base/out state.
+        :param event: event code, see transitions.py
+        :return: the branch it took
+        """
+        state = self.game_state
+        cum_probs, branches = self.table[event][state['outs']][state['bases']]
+        if len(branches) == 1:
+            branch = branches[0]
         else:
-            # bases empty
-            self.game_state['2nd_base'] = True
-
-    def triple(self):
-        if self.printing:
-            print("Hits a triple!")
-        if self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # bases loaded
-            self.game_state['score'] += 3
-            self.game_state['1st_base'] = False
-            self.game_state['2nd_base'] = False
-        elif self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st and 2nd
-            self.game_state['score'] += 2
-            self.game_state['1st_base'] = False
-            self.game_state['2nd_base'] = False
-            self.game_state['3rd_base'] = True
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 1st and 3rd
-            self.game_state['score'] += 2
-            self.game_state['1st_base'] = False
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st only
-            self.game_state['score'] += 1
-            self.game_state['1st_base'] = False
-            self.game_state['3rd_base'] = True
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 2nd and 3rd
-            self.game_state['score'] += 2
-            self.game_state['2nd_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 2nd only
-            self.game_state['score'] += 1
-            self.game_state['2nd_base'] = False
-            self.game_state['3rd_base'] = True
-        elif not self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 3rd only
-            self.game_state['score'] += 1
+            k = bisect_right(cum_probs, self.rng.random())
+            branch = branches[min(k, len(branches) - 1)]
+        state['bases'] = branch.next_bases
+        state['score'] += branch.runs
+        state['outs'] += branch.outs_added
+        return branch
+
+    def advance_runners(self, event):
+        """ Same as advance, but with the probabilities of the runners on base. """
+        state = self.game_state
+        outs, bases = state['outs'], state['bases']
+        cum_probs, branches = self.table[event][outs][bases]
+        if len(branches) == 1:
+            branch = branches[0]
         else:
-            # bases empty
-            self.game_state['3rd_base'] = True
-
-    def homerun(self):
+            runners = state['runners']
+            row = (runner_combo(*runners) * NR_EVENTS + event) * NR_STATES + state_index(outs, bases)
+            k = bisect_right(self.runner_cum_probs[row], self.rng.random())
+            branch = branches[min(k, len(branches) - 1)]
+        if branch.moves_runners:
+            self.move_runners(branch)
+        state['bases'] = branch.next_bases
+        state['score'] += branch.runs
+        state['outs'] += branch.outs_added
+        return branch
+
+    def advance_traced(self, event):
+        """ Same as advance (or advance_runners), but records and/or prints the event. """
+        state = self.game_state
+        outs, bases = state['outs'], state['bases']
+        k, branch = self.pick_branch(event)
+        self.move_runners(branch)
+        state['bases'] = branch.next_bases
+        state['score'] += branch.runs
+        state['outs'] += branch.outs_added
+        if event == STEAL and not branch.notes:
+            # nothing happened
+            return branch
+        if self.recorder is not None:
+            self.recorder.record(self.game_nr, self.inning, state['batter_up'], event, k,
+                                 outs, bases, branch.next_bases, branch.runs)
         if self.printing:
-            print("Hits a home-run!")
-        runners = [self.game_state['1st_base'], self.game_state['2nd_base'], self.game_state['3rd_base']].count(True)
-        self.game_state['score'] += 1 + runners
-        self.game_state['1st_base'] = False
-        self.game_state['2nd_base'] = False
-        self.game_state['3rd_base'] = False
-
-    def steal(self):
-        if self.game_state['1st_base'] and not self.game_state['2nd_base']:
-            if np.random.rand() < self.prob_steal_2nd_base:
-                self.game_state['2nd_base'] = True
-                self.game_state['1st_base'] = False
-                if self.printing:
-                    print("Steal! Runner on 2nd base now.")
-        if self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            if np.random.rand() < self.prob_steal_3rd_base:
-                if not self.game_state['1st_base']:
-                    self.game_state['3rd_base'] = True
-                    self.game_state['2nd_base'] = False
-                    if self.printing:
-                        print("Steal! Runner on 3rd base now.")
-                else:
-                    self.game_state['3rd_base'] = True
-                    self.game_state['2nd_base'] = True
-                    self.game_state['1st_base'] = False
-                    if self.printing:
-                        print("Double steal! Runners on 2nd and 3rd now.")
-        if self.game_state['3rd_base']:
-            if np.random.rand() < self.prob_steal_home:
-                self.game_state['score'] += 1
-                self.game_state['3rd_base'] = False
-                if self.printing:
-                    print("Steal home! Run scored!")
-
-    def double_play(self):
-        self.game_state['outs'] += 1
-        if self.printing:
-            print("Double play!")
-        if self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # bases loaded, dp over home and 1st
-            self.game_state['1st_base'] = False
-        elif self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st and 2nd, dp over 2nd and 1st
-            self.game_state['1st_base'] = False
-            self.game_state['2nd_base'] = False
-            self.game_state['3rd_base'] = True
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 1st and 3rd, dp over 2nd and 1st
-            if self.game_state['outs'] < 3:
-                self.game_state['score'] += 1
-            self.game_state['1st_base'] = False
-            self.game_state['3rd_base'] = False
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st only, std dp
-            self.game_state['1st_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 2nd and 3rd, sac fly out at home
-            self.game_state['3rd_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 2nd only, sac fly out at 3rd
-            self.game_state['2nd_base'] = False
-        elif not self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 3rd only, sac fly out at home
-            self.game_state['3rd_base'] = False
-        # else, bases empty, dp not possible
-
-    def sac_fly_or_bunt(self):
-        if self.printing:
-            print("Runner(s) advance(s) on the play.")
-        if self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # bases loaded, all runners move up
-            self.game_state['score'] += 1
-            self.game_state['1st_base'] = False
-        elif self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st and 2nd, both move up
-            self.game_state['1st_base'] = False
-            self.game_state['3rd_base'] = True
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 1st and 3rd, both move up
-            self.game_state['score'] += 1
-            self.game_state['1st_base'] = False
-            self.game_state['2nd_base'] = True
-            self.game_state['3rd_base'] = False
-        elif self.game_state['1st_base'] and not self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 1st only, moves up
-            self.game_state['1st_base'] = False
-            self.game_state['2nd_base'] = True
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 2nd and 3rd, both move up
-            self.game_state['score'] += 1
-            self.game_state['2nd_base'] = False
-        elif not self.game_state['1st_base'] and self.game_state['2nd_base'] and not self.game_state['3rd_base']:
-            # 2nd only, moves up
-            self.game_state['2nd_base'] = False
-            self.game_state['3rd_base'] = True
-        elif not self.game_state['1st_base'] and not self.game_state['2nd_base'] and self.game_state['3rd_base']:
-            # 3rd only, scores
-            self.game_state['score'] += 1
-            self.game_state['3rd_base'] = False
-        # else, bases empty, advancing runners not possible
+            name = self.lineup[state['batter_up']].name
+            for line in eventlog.event_lines(event, outs, bases, k, name):
+                print(line)
+        return branch
+
+    def advance_profiled(self, event):
+        """ Same as advance (or advance_traced), but counts and sometimes times the event. """
+        profile = self.profile
+        if profile.take_sample():
+            start = perf_counter()
+            branch = self.advance_unprofiled(event)
+            profile.time_branch(branch, perf_counter() - start)
+        else:
+            branch = self.advance_unprofiled(event)
+        profile.count(branch)
+        return branch
+
+    def pick_branch(self, event):
+        """
+        Picks a branch of the event in the current state, with the
+        probabilities of the runners on base if they have their own.
+        :return: index of the branch, the branch
+        """
+        state = self.game_state
+        outs, bases = state['outs'], state['bases']
+        cum_probs, branches = self.table[event][outs][bases]
+        if len(branches) == 1:
+            return 0, branches[0]
+        if self.runner_cum_probs is not None:
+            row = (runner_combo(*state['runners']) * NR_EVENTS + event) * NR_STATES + state_index(outs, bases)
+            cum_probs = self.runner_cum_probs[row]
+        k = min(bisect_right(cum_probs, self.rng.random()), len(branches) - 1)
+        return k, branches[k]
+
+    def move_runners(self, branch):
+        """ Keeps track of who is on which base. """
+        state = self.game_state
+        # by where they were: the batter, and the runners on 1st, 2nd and 3rd
+        players = [state['batter_up']] + state['runners']
+        state['runners'] = [players[source] if source >= 0 else NO_RUNNER for source in branch.sources]
 
     def next_batter(self):
         # batter indices go from 0 to 8
@@ -0,0 +1,295 @@
+"""
+Vectorized version of the baseball Game: plays many games at once.
+
+Every game is a lane in a set of NumPy arrays (base/out state, score, inning,
+batter_up). One call to step() lets every unfinished game play one plate
+appearance, using the same transition tables as baseball.Game.
+
+The lanes can also each play with their own Game parameters (param_sets), then
+there is one transition table per parameter set, stacked on top of each other.
+When batters have their own baserunning probabilities, every lane keeps track
+of who is on base, and the branch probabilities come from a table with a row
+for every combination of runners.
+"""
+import numpy as np
+import transitions
+from transitions import MAX_BRANCHES, NO_RUNNER, NR_EVENTS, NR_STATES, STEAL, runner_combo
+
+# random streams
+STEAL_ROLL, SWING_ROLL, EVENT_ROLL = range(3)
+
+
+class RandomStreams:
+    """
+    Common random numbers: one stream each for the steal attempts, the swings
+    and the rolls within an event, and every step draws a number for every
+    game, also the finished ones. So two BatchGames with the same seed see the
+    same numbers in the same plate appearance of the same game.
+    """
+    def __init__(self, seed, nr_games, antithetic=False):
+        """
+        :param antithetic: use 1 - u instead of u
+        """
+        self.nr_games = nr_games
+        self.antithetic = antithetic
+        self.generators = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(3)]
+
+    def draw(self, stream, lane):
+        return self.draw_all(stream).take(lane)
+
+    def draw_all(self, stream):
+        """ A number for every game. """
+        u = self.generators[stream].random(self.nr_games)
+        if self.antithetic:
+            # stay below 1, the tables are not made for u == 1
+            u = np.minimum(1.0 - u, 1.0 - 2.0 ** -53)
+        return u
+
+
+class CombinedStreams:
+    """
+    The RandomStreams of several groups of games played in one BatchGame,
+    one after the other. Every group sees the same numbers as when it would
+    be played on its own with its RandomStreams.
+    """
+    def __init__(self, streams):
+        """
+        :param streams: list of RandomStreams, one per group of lanes
+        """
+        self.streams = streams
+
+    def draw(self, stream, lane):
+        return np.concatenate([streams.draw_all(stream) for streams in self.streams]).take(lane)
+
+
+class BatchGame:
+    def __init__(self, lineup, nr_games, nr_innings=9, rng=None, orders=None,
+                 crn_seed=None, antithetic=False, streams=None, param_sets=None, param_index=None,
+                 details=False, leadoffs=None,
+                 prob_advance_runner_on_out=0.2,
+                 prob_double_play=0.4,
+                 prob_steal_2nd_base=0.05,
+                 prob_steal_3rd_base=0.01,
+                 prob_steal_home=0.001,
+                 prob_1st_to_3rd=0.2,
+                 prob_score_from_2nd_on_single=0.5,
+                 prob_score_from_1st_on_double=0.3):
+        """
+        :param orders: optional batting order per lane, array of shape
+                        (nr_games, 9) with indices into the lineup
+        :param crn_seed: if given, draw from RandomStreams with this seed instead
+                        of rng, for common random numbers between BatchGames
+        :param antithetic: with crn_seed, use the antithetic numbers 1 - u
+        :param streams: RandomStreams or CombinedStreams to draw from, instead
+                        of crn_seed
+        :param param_sets: optional list of dicts with (some of) the Game
+                        probabilities, the others are taken from the arguments
+                        below, every lane plays with one of these sets
+        :param param_index: with param_sets, the index of the set of every
+                        lane, array of nr_games
+        :param details: also keep the runs per inning, plate appearances and
+                        outcomes of every game, see get_details
+        :param leadoffs: optional place in the batting order (0 to 8) of the
+                        batter that leads off the first inning, per lane, to
+                        go on with the order of an earlier BatchGame, see
+                        get_next_batters
+        """
+        self.lineup = lineup
+        self.nr_games = nr_games
+        self.nr_innings = nr_innings
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.orders = None if orders is None else np.asarray(orders, dtype=np.intp).ravel()
+        self.details = details
+        self.leadoffs = leadoffs
+        self.streams = streams
+        if crn_seed is not None:
+            self.streams = RandomStreams(crn_seed, nr_games, antithetic)
+
+        # cumulative outcome probabilities per batter, one array per outcome
+        cum_probs = np.array([batter.cum_probs for batter in lineup])
+        self.cum_probs = list(cum_probs.T[:-1])
+
+        self.prob_advance_runner_on_out = prob_advance_runner_on_out
+        self.prob_double_play = prob_double_play
+
+        self.prob_steal_2nd_base = prob_steal_2nd_base
+        self.prob_steal_3rd_base = prob_steal_3rd_base
+        self.prob_steal_home = prob_steal_home
+
+        self.prob_1st_to_3rd = prob_1st_to_3rd
+        self.prob_score_from_2nd_on_single = prob_score_from_2nd_on_single
+        self.prob_score_from_1st_on_double = prob_score_from_1st_on_double
+
+        if param_sets is None:
+            tables = transitions.build_arrays(self.get_params())
+            self.row_offset = None
+        else:
+            tables = self.build_stacked_arrays(param_sets)
+            # first row of the table of every lane
+            self.row_offset = np.asarray(param_index, dtype=np.intp) * (NR_EVENTS * NR_STATES)
+        self.branch_cum_probs = list(tables['cum_probs'].T[:-1])
+        self.next_state = tables['next_state'].ravel()
+        self.runs = tables['runs'].ravel()
+        # only when some batters run the bases with their own probabilities
+        self.runner_cum_probs = None
+        if any(batter.baserunning for batter in lineup):
+            assert param_sets is None, "baserunning of the batters can not be combined with param_sets"
+            assert len(lineup) <= NO_RUNNER
+            self.runner_cum_probs = list(transitions.get_runner_cum_probs(lineup, self.get_params()).T[:-1])
+            # where the player on 1st, 2nd and 3rd comes from, per branch:
+            # the batter, 1st, 2nd, 3rd, or 4 for nobody
+            sources = np.where(tables['sources'] >= 0, tables['sources'], 4)
+            self.sources = [sources[:, :, base].ravel() for base in range(3)]
+        self.reset_game_state()
+
+    def get_params(self):
+        return {name: getattr(self, name) for name in transitions.PARAM_NAMES}
+
+    def build_stacked_arrays(self, param_sets):
+        """ The tables of transitions.build_arrays of all sets, on top of each other. """
+        all_tables = []
+        for param_set in param_sets:
+            params = self.get_params()
+            params.update(param_set)
+            all_tables.append(transitions.build_arrays(params))
+        return {key: np.concatenate([tables[key] for tables in all_tables]) for key in all_tables[0]}
+
+    def reset_game_state(self):
+        """
+        Only the lanes of unfinished games are kept in the state arrays,
+        lane holds their index into the scores.
+        """
+        n = self.nr_games if self.nr_innings > 0 else 0
+        self.scores = np.zeros(self.nr_games, dtype=np.int32)
+        self.lane = np.arange(n)
+        self.score = np.zeros(n, dtype=np.int32)
+        # outs * 8 + bases, see transitions.state_index
+        self.state = np.zeros(n, dtype=np.intp)
+        self.batter_up = np.zeros(n, dtype=np.intp)
+        if self.leadoffs is not None:
+            self.batter_up[:] = np.asarray(self.leadoffs)[:n]
+        # per game: the place in the order of the batter up when it ended
+        self.next_batters = np.zeros(self.nr_games, dtype=np.intp)
+        self.inning = np.zeros(n, dtype=np.int16)
+        # lineup index of the runner on 1st, 2nd and 3rd, only kept up to
+        # date when the batters have their own baserunning probabilities
+        self.runners = np.full((3, n), NO_RUNNER, dtype=np.intp)
+        self.nr_plate_appearances = 0
+        if self.details:
+            # per game: the score after every inning, and how often each outcome of a swing happened
+            self.inning_scores = np.zeros((self.nr_games, self.nr_innings), dtype=np.int32)
+            self.outcome_counts = np.zeros((self.nr_games, 7), dtype=np.int32)
+
+    def play(self):
+        while len(self.lane) > 0:
+            self.step()
+
+    def step(self):
+        """ Every unfinished game plays one plate appearance. """
+        self.nr_plate_appearances += len(self.lane)
+        self.advance(STEAL, STEAL_ROLL)
+        outcome = self.swing()
+        self.advance(outcome, EVENT_ROLL)
+        self.batter_up += 1
+        self.batter_up[self.batter_up == 9] = 0
+
+        # three outs: half-inning is over for those lanes
+        over = self.state >= NR_STATES
+        if self.details:
+            # every lane is there once, so += works with fancy indexing
+            self.outcome_counts.ravel()[self.lane * 7 + outcome] += 1
+            self.inning_scores[self.lane[over], self.inning[over]] = self.score[over]
+        self.inning += over
+        self.state[over] = 0
+        self.runners[:, over] = NO_RUNNER
+        done = self.inning >= self.nr_innings
+        if done.any():
+            self.scores[self.lane[done]] = self.score[done]
+            self.next_batters[self.lane[done]] = self.batter_up[done]
+            keep = ~done
+            self.lane = self.lane[keep]
+            self.score = self.score[keep]
+            self.state = self.state[keep]
+            self.batter_up = self.batter_up[keep]
+            self.inning = self.inning[keep]
+            self.runners = self.runners[:, keep]
+
+    def swing(self):
+        """
+        The batter up in every lane takes a swing
+        :return: outcome codes, indices into Batter.options
+        """
+        batter = self.get_batter()
+        u = self.uniforms(SWING_ROLL)
+        outcome = np.zeros(len(self.lane), dtype=np.intp)
+        for cum_probs in self.cum_probs:
+            outcome += u >= cum_probs.take(batter)
+        return outcome
+
+    def get_batter(self):
+        """ The index in the lineup of the batter up in every lane. """
+        if self.orders is None:
+            return self.batter_up
+        return self.orders.take(self.lane * 9 + self.batter_up)
+
+    def advance(self, events, stream):
+        """
+        Every lane plays one event from the transition table.
+        :param events: event code for all lanes, or one per lane
+        :param stream: which random stream to use, for common random numbers
+        """
+        row = events * NR_STATES + self.state
+        if self.row_offset is not None:
+            row += self.row_offset.take(self.lane)
+        u = self.uniforms(stream)
+        branch = row * MAX_BRANCHES
+        if self.runner_cum_probs is None:
+            for cum_probs in self.branch_cum_probs:
+                branch += u >= cum_probs.take(row)
+        else:
+            runner_row = runner_combo(*self.runners) * (NR_EVENTS * NR_STATES) + row
+            for cum_probs in self.runner_cum_probs:
+                branch += u >= cum_probs.take(runner_row)
+            self.move_runners(branch)
+        self.state = self.next_state.take(branch)
+        self.score += self.runs.take(branch)
+
+    def move_runners(self, branch):
+        """ Keeps track of who is on which base, given the branch every lane took. """
+        # by where they were: the batter, the runners on 1st, 2nd and 3rd, nobody
+        n = len(self.lane)
+        players = np.empty((5, n), dtype=np.intp)
+        players[0] = self.get_batter()
+        players[1:4] = self.runners
+        players[4] = NO_RUNNER
+        players = players.ravel()
+        lanes = np.arange(n)
+        for base, sources in enumerate(self.sources):
+            self.runners[base] = players.take(sources.take(branch) * n + lanes)
+
+    def uniforms(self, stream):
+        """ One uniform random number for every unfinished game. """
+        if self.streams is None:
+            return self.rng.random(len(self.lane))
+        return self.streams.draw(stream, self.lane)
+
+    def get_scores(self):
+        return self.scores
+
+    def get_next_batters(self):
+        """ :return: per game, the place in the order of the batter that would lead off the next inning """
+        return self.next_batters
+
+    def get_details(self):
+        """
+        Only with details=True
+        :return: dict with per game the runs, runs per inning, nr of plate
+                    appearances and nr of each outcome (as in Batter.options)
+        """
+        inning_runs = np.diff(self.inning_scores, axis=1, prepend=0)
+        return {
+            'runs': self.scores,
+            'inning_runs': inning_runs,
+            'plate_appearances': self.outcome_counts.sum(axis=1),
+            'outcomes': self.outcome_counts,
+        }
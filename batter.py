@@ -1,5 +1,8 @@
-from numpy.random import choice
-import pandas as pd
+import numpy as np
+from transitions import RUNNER_PARAMS
+
+# a Game draws the outcomes of a batter up to this many at a time
+SWING_BLOCK_SIZE = 65_536
 
 
 def compute_probs_from_dataset(dataset, batter_id):
@@ -36,28 +39,87 @@ def compute_probs_from_dataset(dataset, batter_id):
     return probs, name
 
 
+def compute_probs_table(dataset):
+    """
+    Same as compute_probs_from_dataset, but for all players at once
+    :param dataset: a pandas dataframe imported from Excel file from
+                        http://baseballguru.com/bbdata1.html
+    :return: array of shape (nr of rows, 7)
+    """
+    plate_appears, counts = compute_counts_table(dataset)
+    return counts / plate_appears[:, None]
+
+
+def compute_counts_table(dataset):
+    """
+    The number of times each option happened, for all players at once
+    :param dataset: a pandas dataframe like for compute_probs_table
+    :return: plate appearances (array of nr of rows), counts (array of
+                shape (nr of rows, 7))
+    """
+    plate_appears = dataset['tap'].to_numpy(dtype=float)
+    strike_outs = dataset['SO'].to_numpy(dtype=float)
+    walks = dataset['BB'].to_numpy(dtype=float)
+    hits = dataset['H'].to_numpy(dtype=float)
+    doubles = dataset['db'].to_numpy(dtype=float)
+    triples = dataset['tr'].to_numpy(dtype=float)
+    homeruns = dataset['HR'].to_numpy(dtype=float)
+    outs = plate_appears - strike_outs - walks - hits
+    singles = hits - doubles - triples - homeruns
+    return plate_appears, np.stack([strike_outs, outs, walks, singles, doubles, triples, homeruns], axis=1)
+
+
 class Batter:
-    def __init__(self, probabilities=None, name="Joe Default", player_id=None, dataset=None):
+    def __init__(self, probabilities=None, name="Joe Default", player_id=None, dataset=None,
+                 baserunning=None):
         """
         One of these arguments needs to be not-None:
         :param probabilities: must sum up to one
         :param player_id: should be like in the Excel sheet
         :param name: only necessary if not from Excel, otherwise will be taken
+        :param baserunning: optional dict with this player's own values of the
+                            probabilities in transitions.RUNNER_PARAMS (like
+                            prob_steal_2nd_base), for when he is on base
         """
         if probabilities is None:
             self.probs, self.name = compute_probs_from_dataset(dataset, player_id)
         else:
             self.probs = probabilities
             self.name = name
+        for name in baserunning or {}:
+            if name not in RUNNER_PARAMS:
+                raise ValueError(f"unknown baserunning parameter {name}, use one of {', '.join(RUNNER_PARAMS)}")
+        self.baserunning = dict(baserunning or {})
         self.options = ["strike-out", "in-play-out", "walk",
                         "single", "double", "triple", "homerun"]
+        cum_probs = np.cumsum(np.asarray(self.probs, dtype=float))
+        self.cum_probs = cum_probs / cum_probs[-1]
 
-    def swing(self):
+    def swing(self, rng=None):
         """
         Batter takes a swing
+        :param rng: numpy Generator to draw from, the global one if not given
         :return: the result (may actually be everything, also a walk)
         """
-        return choice(self.options, p=self.probs)
+        return self.options[self.swing_code(rng)]
+
+    def swing_code(self, rng=None):
+        """
+        Batter takes a swing
+        :param rng: numpy Generator to draw from, the global one if not given
+        :return: the result as an index into options
+        """
+        u = np.random.random() if rng is None else rng.random()
+        return min(int(np.searchsorted(self.cum_probs, u, side='right')), 6)
+
+    def draw_swings(self, rng, size):
+        """
+        The outcomes of many swings at once, see Game.next_swing
+        :return: list of codes, in reverse order, so that pop() hands them out
+                    in the order they were drawn
+        """
+        codes = np.searchsorted(self.cum_probs, rng.random(size), side='right')
+        return np.minimum(codes, 6)[::-1].tolist()
 
     def print_probabilities(self):
         print(f"strike-out: {self.probs[0]:.3f} \t "
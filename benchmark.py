@@ -0,0 +1,211 @@
+"""
+Benchmarks of the simulator, to see if a change makes it faster or slower.
+
+Every workload is timed (best of a few runs) and reports games per second,
+plate appearances per second and its peak memory (traced in a separate run).
+The results are saved as json, and can be compared to the json of an earlier
+run: throughput that drops, or time and memory that grow, by more than the
+threshold is flagged as a regression.
+
+The games are played by the lineup of setup_own, so that they do not depend
+on the Excel sheet.
+
+Usage: python benchmark.py [--output bench.json] [--baseline old.json]
+                           [--threshold 0.1] [--quick] [workload names]
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from baseball import Game
+from batch import BatchGame
+from simulator import setup_mlb, setup_own
+
+# metrics where higher is better, for the others lower is better
+HIGHER_IS_BETTER = ('games_per_sec', 'pas_per_sec')
+# differences in time below this are noise, for the workloads without games
+NOISE_SECONDS = 0.005
+
+
+def play_one_game(lineup, rng, nr_games=1000):
+    """
+    Like simulator.play_one_game without printing: a new Game for every game.
+    :return: nr of games, nr of plate appearances
+    """
+    nr_plate_appearances = 0
+    for _ in range(nr_games):
+        game = Game(lineup, printing=False, rng=rng)
+        game.reset_game_state()
+        game.play()
+        game.get_score()
+        nr_plate_appearances += game.nr_plate_appearances
+    return nr_games, nr_plate_appearances
+
+
+def play_many_games(lineup, rng, nr_games):
+    """ The loop of simulator.play_games. """
+    game = Game(lineup, printing=False, rng=rng)
+    for _ in range(nr_games):
+        game.reset_game_state()
+        game.play()
+        game.get_score()
+    return nr_games, game.nr_plate_appearances
+
+
+def play_batched_games(lineup, rng, nr_games, batch_size=100_000):
+    """ The loop of simulator.play_batched_games. """
+    nr_plate_appearances = 0
+    for start in range(0, nr_games, batch_size):
+        batch = BatchGame(lineup, min(batch_size, nr_games - start), rng=rng)
+        batch.play()
+        batch.get_scores()
+        nr_plate_appearances += batch.nr_plate_appearances
+    return nr_games, nr_plate_appearances
+
+
+def load_mlb(lineup, rng):
+    setup_mlb()
+    return 0, 0
+
+
+def load_own(lineup, rng):
+    setup_own()
+    return 0, 0
+
+
+# name -> (function(lineup, rng) returning nr of games and plate appearances,
+#          nr of timed runs, part of the quick set)
+WORKLOADS = {
+    'setup_mlb': (load_mlb, 5, True),
+    'setup_own': (load_own, 5, True),
+    'one_game': (play_one_game, 3, True),
+    'many_games_1e4': (lambda lineup, rng: play_many_games(lineup, rng, 10_000), 3, True),
+    'many_games_1e5': (lambda lineup, rng: play_many_games(lineup, rng, 100_000), 1, False),
+    'many_games_1e6': (lambda lineup, rng: play_many_games(lineup, rng, 1_000_000), 1, False),
+    'batched_games_1e5': (lambda lineup, rng: play_batched_games(lineup, rng, 100_000), 3, True),
+    'batched_games_1e6': (lambda lineup, rng: play_batched_games(lineup, rng, 1_000_000), 1, False),
+}
+
+
+def run_workload(function, repeats, seed=0):
+    """
+    :return: dict with the best time of the repeats, the throughput and the
+                peak memory of one more (traced) run
+    """
+    lineup = setup_own()
+    best = np.inf
+    for repeat in range(repeats):
+        rng = np.random.default_rng(seed + repeat)
+        start = time.perf_counter()
+        nr_games, nr_plate_appearances = function(lineup, rng)
+        best = min(best, time.perf_counter() - start)
+
+    # tracing slows everything down, so it gets a run of its own
+    tracemalloc.start()
+    function(lineup, np.random.default_rng(seed))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        'seconds': best,
+        'nr_games': nr_games,
+        'nr_plate_appearances': nr_plate_appearances,
+        'peak_memory_mb': peak / 2 ** 20,
+    }
+    if nr_games > 0:
+        result['games_per_sec'] = nr_games / best
+        result['pas_per_sec'] = nr_plate_appearances / best
+    return result
+
+
+def run_benchmarks(names=None, quick=False, seed=0, progress=True):
+    """
+    :param names: which workloads to run, all (of the quick set) if None
+    :param quick: leave out the workloads that take more than a few seconds
+    :return: dict with info about the machine and the results per workload
+    """
+    if names is None:
+        names = [name for name, (_, _, in_quick) in WORKLOADS.items() if in_quick or not quick]
+    results = {}
+    for name in names:
+        function, repeats, _ = WORKLOADS[name]
+        results[name] = run_workload(function, repeats, seed)
+        if progress:
+            print(format_result(name, results[name]))
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'results': results,
+    }
+
+
+def format_result(name, result):
+    line = f"{name:<20} {result['seconds']:>9.4f} s"
+    if 'games_per_sec' in result:
+        line += f" {result['games_per_sec']:>12,.0f} games/s {result['pas_per_sec']:>13,.0f} PAs/s"
+    else:
+        line += " " * 37
+    return line + f" {result['peak_memory_mb']:>9.2f} MB peak"
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares the results to those of an earlier run.
+    :param threshold: relative change that counts as a regression, 0.1 is 10%
+    :return: list of (workload, metric, baseline value, new value, relative
+                change), for the regressions only
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            continue
+        old = baseline['results'][name]
+        metrics = HIGHER_IS_BETTER if 'games_per_sec' in result else ('seconds',)
+        for metric in metrics + ('peak_memory_mb',):
+            if metric not in old or old[metric] == 0:
+                continue
+            change = result[metric] / old[metric] - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if metric == 'seconds' and result[metric] - old[metric] < NOISE_SECONDS:
+                continue
+            if worse > threshold:
+                regressions.append((name, metric, old[metric], result[metric], change))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the baseball simulator")
+    parser.add_argument('workloads', nargs='*', help=f"any of {', '.join(WORKLOADS)}")
+    parser.add_argument('--output', help="save the results to this json file")
+    parser.add_argument('--baseline', help="json file of an earlier run to compare to")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative change that counts as a regression (default 0.1)")
+    parser.add_argument('--quick', action='store_true', help="skip the slow workloads")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(args.workloads or None, args.quick, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, old, new, change in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Command line entry point for batch jobs: plays every lineup of a JSONL file,
+and writes one json result per lineup as soon as it is done.
+
+Every line of the input is a lineup spec, either with player ids (of the
+Excel sheet) or with the probabilities of the nine batters:
+
+    {"id": "mlb", "player_ids": ["anderti01", ...]}
+    {"id": "own", "probs": [[0.15, 0.5, 0.15, 0.15, 0.045, 0.005, 0.0], ...]}
+
+optional: "nr_games", "seed", "game_params" (dict of Game probabilities),
+"baserunning" (nine dicts, see Batter, only with mode simulate) and "mode":
+"simulate" (BatchGame), "innings" (markov.sample_scores) or "exact"
+(markov.exact_score_distribution).
+
+The modules that take time to import (pandas for the Excel sheet, the
+engines) are only imported when a lineup needs them.
+
+Usage: python cli.py lineups.jsonl [--output results.jsonl] [--mode simulate]
+                     [--nr-games 10000] [--seed 0] [--workers 4]
+Use - to read the lineups from stdin.
+"""
+import argparse
+import json
+import sys
+import time
+
+MODES = ('simulate', 'innings', 'exact')
+# the PlayerStore of every source, loaded when first needed
+stores = {}
+
+
+def get_store(source):
+    if source not in stores:
+        from player_store import PlayerStore
+        stores[source] = PlayerStore(source)
+    return stores[source]
+
+
+def read_lines(lines):
+    """ :return: generator of (line nr, line), blank lines are skipped """
+    for line_nr, line in enumerate(lines, start=1):
+        if line.strip():
+            yield line_nr, line
+
+
+def make_lineup(spec, source="mlb2019.xls"):
+    """ :return: list of the nine Batters of a spec """
+    from batter import Batter
+    baserunning = spec.get('baserunning') or [None] * 9
+    if not isinstance(baserunning, list) or len(baserunning) != 9:
+        raise ValueError("baserunning is a list with nine dicts (or nulls)")
+    for running in baserunning:
+        if running is not None and not isinstance(running, dict):
+            raise ValueError(f"the baserunning of a batter is a dict or null, not {running!r}")
+    if 'player_ids' in spec:
+        store = get_store(source)
+        for player_id in spec['player_ids']:
+            if player_id not in store.rows:
+                raise ValueError(f"unknown player id {player_id}")
+        lineup = [Batter(probabilities=store.get_probs(player_id), name=store.get_name(player_id),
+                         baserunning=running)
+                  for player_id, running in zip(spec['player_ids'], baserunning)]
+    elif 'probs' in spec:
+        lineup = [Batter(probabilities=probs, name=f"Batter{i + 1}", baserunning=running)
+                  for i, (probs, running) in enumerate(zip(spec['probs'], baserunning))]
+    else:
+        raise ValueError("a lineup needs player_ids or probs")
+    if len(lineup) != 9:
+        raise ValueError("a lineup has nine batters")
+    return lineup
+
+
+def run_spec(spec, mode='simulate', nr_games=10_000, seed=None, batch_size=100_000,
+             source="mlb2019.xls"):
+    """
+    Plays (or computes) the scores of one lineup spec, the values in the spec
+    take precedence over the arguments.
+    :return: result dict
+    """
+    import numpy as np
+    if not isinstance(spec, dict):
+        raise ValueError("a lineup spec is a json object")
+    mode = spec.get('mode', mode)
+    nr_games = int(spec.get('nr_games', nr_games))
+    seed = spec.get('seed', seed)
+    game_params = spec.get('game_params', {})
+    if mode in ('innings', 'exact') and any(spec.get('baserunning') or []):
+        raise ValueError(f"baserunning only works with mode simulate, not {mode}")
+    lineup = make_lineup(spec, source)
+    start = time.perf_counter()
+
+    if mode == 'exact':
+        from markov import exact_score_distribution
+        dist = exact_score_distribution(lineup, game_params)
+        result = {'mean': dist.mean(), 'std': dist.std(), 'median': dist.median(),
+                  'pmf': dist.pmf.tolist()}
+    elif mode in ('simulate', 'innings'):
+        from stats import ScoreStats
+        rng = np.random.default_rng(seed)
+        stats = ScoreStats()
+        for batch_start in range(0, nr_games, batch_size):
+            games = min(batch_size, nr_games - batch_start)
+            if mode == 'simulate':
+                from batch import BatchGame
+                batch = BatchGame(lineup, games, rng=rng, **game_params)
+                batch.play()
+                stats.add_scores(batch.get_scores())
+            else:
+                from markov import sample_scores
+                stats.add_scores(sample_scores(lineup, games, rng=rng, game_params=game_params))
+        result = stats.to_dict()
+    else:
+        raise ValueError(f"unknown mode {mode}, use one of {', '.join(MODES)}")
+    result['mode'] = mode
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_line(line_nr, line, options):
+    """ run_spec of a line of the input, with its line nr and id, and errors as results. """
+    result = {'line': line_nr}
+    try:
+        spec = json.loads(line)
+        if isinstance(spec, dict) and 'id' in spec:
+            result['id'] = spec['id']
+        result.update(run_spec(spec, **options))
+    except (ValueError, KeyError, TypeError) as error:
+        result['error'] = f"{type(error).__name__}: {error}"
+    return result
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Plays the lineups of a JSONL file")
+    parser.add_argument('lineups', help="JSONL file with one lineup spec per line, - for stdin")
+    parser.add_argument('--output', help="JSONL file for the results (default stdout)")
+    parser.add_argument('--mode', choices=MODES, default='simulate')
+    parser.add_argument('--nr-games', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=100_000)
+    parser.add_argument('--source', default="mlb2019.xls", help="Excel sheet with the players")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="play the lineups on this many processes, results come in the order they finish")
+    args = parser.parse_args(args)
+    options = {'mode': args.mode, 'nr_games': args.nr_games, 'seed': args.seed,
+               'batch_size': args.batch_size, 'source': args.source}
+
+    infile = sys.stdin if args.lineups == '-' else open(args.lineups)
+    outfile = sys.stdout if args.output is None else open(args.output, 'w')
+    pool = None
+    try:
+        if args.workers is None:
+            results = (run_line(line_nr, line, options) for line_nr, line in read_lines(infile))
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            pool = ProcessPoolExecutor(max_workers=args.workers)
+            futures = [pool.submit(run_line, line_nr, line, options) for line_nr, line in read_lines(infile)]
+            results = (future.result() for future in as_completed(futures))
+        for result in results:
+            outfile.write(json.dumps(result) + "\n")
+            outfile.flush()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
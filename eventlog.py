@@ -0,0 +1,121 @@
+"""
+Compact binary play-by-play log of the Game.
+
+An EventRecorder collects one fixed-width record per event (every plate
+appearance, and every steal attempt that succeeded) in a preallocated NumPy
+structured array, and appends it to a file in chunks. The last chunk is only
+written by flush() or close(), or at the end of a with block:
+
+    with EventRecorder("games.log") as recorder:
+        game = Game(lineup, recorder=recorder)
+        ...
+
+replay() turns a log
+back into the text that Game prints with printing=True.
+
+Usage: python eventlog.py game.log [names of the nine batters]
+"""
+import os
+import sys
+import numpy as np
+from transitions import BRANCHES, STEAL
+
+EVENT_DTYPE = np.dtype([
+    ('game', '<u4'),
+    ('inning', 'u1'),
+    ('batter', 'u1'),         # index in the lineup
+    ('event', 'u1'),          # event code, see transitions.py
+    ('branch', 'u1'),         # which branch of the event happened
+    ('outs', 'u1'),           # before the event
+    ('bases_before', 'u1'),
+    ('bases_after', 'u1'),
+    ('runs', 'u1'),
+])
+
+
+class EventRecorder:
+    def __init__(self, path=None, chunk_size=1 << 16):
+        """
+        :param path: file to append the records to, if None they are kept in memory
+        :param chunk_size: records per chunk
+        """
+        self.path = path
+        self.chunk = np.zeros(chunk_size, dtype=EVENT_DTYPE)
+        self.size = 0
+        self.chunks = []
+        if path is not None:
+            # start a new log
+            open(path, 'wb').close()
+
+    def record(self, game, inning, batter, event, branch, outs, bases_before, bases_after, runs):
+        self.chunk[self.size] = (game, inning, batter, event, branch, outs, bases_before, bases_after, runs)
+        self.size += 1
+        if self.size == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        if self.path is None:
+            self.chunks.append(self.chunk[:self.size].copy())
+        else:
+            with open(self.path, 'ab') as f:
+                f.write(self.chunk[:self.size].tobytes())
+        self.size = 0
+
+    def close(self):
+        """ Writes the records that are not in the file yet. """
+        if self.size:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_events(self):
+        """ All records so far, as one structured array. """
+        self.flush()
+        if self.path is None:
+            return np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=EVENT_DTYPE)
+        return load_log(self.path)
+
+
+def load_log(path):
+    """ Memory-maps a log file written by an EventRecorder. """
+    if os.path.getsize(path) == 0:
+        # an empty file can not be memory-mapped
+        return np.zeros(0, dtype=EVENT_DTYPE)
+    return np.memmap(path, dtype=EVENT_DTYPE, mode='r')
+
+
+def event_lines(event, outs, bases, branch, name):
+    """ The lines Game prints for one event. """
+    lines = [] if event == STEAL else [f"Now up: {name}"]
+    lines.extend(BRANCHES[event][outs][bases][branch].notes)
+    return lines
+
+
+def replay(events, names=None):
+    """
+    Rebuilds the play-by-play text from a log.
+    :param names: names of the batters in the lineup, numbers if not given
+    :return: generator of lines
+    """
+    last = None
+    for record in events:
+        game, inning = int(record['game']), int(record['inning'])
+        if (game, inning) != last:
+            if last is not None and game != last[0]:
+                yield f"\nGame {game + 1}"
+            yield f"\nInning {inning + 1}"
+            last = (game, inning)
+        batter = int(record['batter'])
+        name = names[batter] if names is not None else f"batter {batter + 1}"
+        yield from event_lines(int(record['event']), int(record['outs']),
+                               int(record['bases_before']), int(record['branch']), name)
+
+
+if __name__ == '__main__':
+    names = sys.argv[2:] or None
+    for line in replay(load_log(sys.argv[1]), names):
+        print(line)
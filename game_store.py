@@ -0,0 +1,138 @@
+"""
+On-disk archive of the outcome of every game, for analysis afterwards.
+
+A GameStore is a directory with one raw file per column (fixed NumPy dtype,
+one row per game) and a small json header with the dtypes, the nr of games
+and free-form metadata (lineup, Game parameters, ...). Games are appended in
+chunks, and the columns are read back as memory maps, so that aggregations
+run chunk by chunk without loading everything into memory.
+
+Columns: runs, inning_runs (per inning), plate_appearances and outcomes (the
+nr of strike-outs, in-play-outs, walks, singles, doubles, triples and
+homeruns), as given by BatchGame.get_details.
+"""
+import json
+import os
+import numpy as np
+from stats import ScoreStats
+
+HEADER = "header.json"
+
+
+def column_specs(nr_innings):
+    """ :return: dict of column name -> (dtype, shape of one row) """
+    return {
+        'runs': ('<u2', ()),
+        'inning_runs': ('<u2', (nr_innings,)),
+        'plate_appearances': ('<u2', ()),
+        'outcomes': ('<u2', (7,)),
+    }
+
+
+class GameStore:
+    def __init__(self, path, nr_innings=9, metadata=None):
+        """
+        Opens the store in directory path, or makes a new one.
+        :param nr_innings: of the games, for a new store
+        :param metadata: dict to save in the header of a new store
+        """
+        self.path = path
+        header_path = os.path.join(path, HEADER)
+        if os.path.exists(header_path):
+            with open(header_path) as f:
+                self.header = json.load(f)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.header = {
+                'version': 1,
+                'nr_games': 0,
+                'nr_innings': nr_innings,
+                'columns': {name: {'dtype': dtype, 'shape': list(shape)}
+                            for name, (dtype, shape) in column_specs(nr_innings).items()},
+                'metadata': metadata or {},
+            }
+            for name in self.header['columns']:
+                open(self.column_path(name), 'wb').close()
+            self.write_header()
+
+    @property
+    def nr_games(self):
+        return self.header['nr_games']
+
+    @property
+    def metadata(self):
+        return self.header['metadata']
+
+    def column_path(self, name):
+        return os.path.join(self.path, name + ".bin")
+
+    def write_header(self):
+        tmp = os.path.join(self.path, HEADER + ".tmp")
+        with open(tmp, 'w') as f:
+            json.dump(self.header, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, HEADER))
+
+    def append(self, columns):
+        """
+        Adds games to the store.
+        :param columns: dict with an array for every column, with one row per game
+        """
+        nr_games = len(columns['runs'])
+        for name, spec in self.header['columns'].items():
+            values = np.asarray(columns[name])
+            assert values.shape == (nr_games, *spec['shape']), f"column {name} has shape {values.shape}"
+            # rows past the nr_games in the header (from an append that was
+            # interrupted) are overwritten
+            with open(self.column_path(name), 'r+b') as f:
+                f.seek(self.nr_games * self.row_size(name))
+                f.write(np.ascontiguousarray(values, dtype=spec['dtype']).tobytes())
+                f.truncate()
+        # the games only count once the header says so
+        self.header['nr_games'] += nr_games
+        self.write_header()
+
+    def row_size(self, name):
+        spec = self.header['columns'][name]
+        return np.dtype(spec['dtype']).itemsize * int(np.prod(spec['shape'], dtype=int))
+
+    def column(self, name, start=0, stop=None):
+        """
+        :return: read-only memory map of the rows start:stop of a column,
+                    no data is read until it is used
+        """
+        spec = self.header['columns'][name]
+        stop = self.nr_games if stop is None else min(stop, self.nr_games)
+        if stop <= start:
+            return np.zeros((0, *spec['shape']), dtype=spec['dtype'])
+        return np.memmap(self.column_path(name), dtype=spec['dtype'], mode='r',
+                         offset=start * self.row_size(name), shape=(stop - start, *spec['shape']))
+
+    def chunks(self, name, chunk_size=1_000_000):
+        """ :return: generator of the column in pieces of chunk_size games """
+        for start in range(0, self.nr_games, chunk_size):
+            yield self.column(name, start, start + chunk_size)
+
+    def score_stats(self, chunk_size=1_000_000):
+        """ ScoreStats of the runs of all games. """
+        stats = ScoreStats()
+        for runs in self.chunks('runs', chunk_size):
+            stats.add_scores(runs)
+        return stats
+
+    def inning_run_distribution(self, chunk_size=1_000_000):
+        """ :return: counts[inning, runs], the nr of games with that many runs in that inning """
+        counts = np.zeros((self.header['nr_innings'], 1), dtype=np.int64)
+        for inning_runs in self.chunks('inning_runs', chunk_size):
+            max_runs = int(inning_runs.max()) + 1 if len(inning_runs) else 1
+            if max_runs > counts.shape[1]:
+                counts = np.pad(counts, ((0, 0), (0, max_runs - counts.shape[1])))
+            for inning in range(counts.shape[0]):
+                counts[inning] += np.bincount(inning_runs[:, inning], minlength=counts.shape[1])
+        return counts
+
+    def outcome_totals(self, chunk_size=1_000_000):
+        """ :return: total nr of each outcome (as in Batter.options) over all games """
+        totals = np.zeros(7, dtype=np.int64)
+        for outcomes in self.chunks('outcomes', chunk_size):
+            totals += outcomes.sum(axis=0, dtype=np.int64)
+        return totals
@@ -0,0 +1,211 @@
+"""
+Exact score distribution of a lineup, without sampling.
+
+The Game is a finite Markov chain: 24 base/out states and the batter up, with
+the runs as the reward. Dynamic programming over the plate appearances of a
+half-inning gives, for every leadoff batter, the joint distribution of the runs
+scored and the next leadoff batter. Chaining the innings gives the probability
+mass function of the runs in a game.
+
+The inning distributions of a lineup are cached, so that other numbers of
+innings, or games sampled inning by inning (sample_scores), cost almost
+nothing once they are known.
+
+The batters all run the bases with the Game parameters, lineups with their own
+Batter.baserunning are not supported.
+"""
+from functools import lru_cache
+import numpy as np
+import transitions
+from batter import Batter
+from transitions import NR_STATES, STEAL
+
+# runs in a single plate appearance: a steal of home plus a grand slam
+MAX_PA_RUNS = 5
+MAX_INNING_RUNS = 40
+# nr of (lineup, parameters) whose inning distributions are kept
+INNING_CACHE_SIZE = 128
+
+
+class ScoreDistribution:
+    def __init__(self, pmf):
+        """
+        :param pmf: pmf[runs] is the probability of scoring that many runs
+        """
+        self.pmf = np.asarray(pmf, dtype=float)
+
+    def mean(self):
+        return np.dot(np.arange(len(self.pmf)), self.pmf)
+
+    def variance(self):
+        runs = np.arange(len(self.pmf))
+        return np.dot((runs - self.mean()) ** 2, self.pmf)
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def quantile(self, q):
+        """ Smallest number of runs with P(score <= runs) >= q. """
+        cdf = np.cumsum(self.pmf)
+        return int(min(np.searchsorted(cdf, q - 1e-12), len(cdf) - 1))
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+def branch_probs(cum_probs):
+    """ The probability of each branch from the cumulative table entries. """
+    return np.diff(cum_probs, prepend=0.0, axis=-1)
+
+
+def event_matrix(tables, event):
+    """
+    :return: matrix[state, runs, next_state] of one event,
+                next_state NR_STATES means three outs
+    """
+    matrix = np.zeros((NR_STATES, MAX_PA_RUNS + 1, NR_STATES + 1))
+    rows = event * NR_STATES + np.arange(NR_STATES)
+    probs = branch_probs(tables['cum_probs'][rows])
+    for state in range(NR_STATES):
+        for k, prob in enumerate(probs[state]):
+            next_state = min(tables['next_state'][rows[state], k], NR_STATES)
+            matrix[state, tables['runs'][rows[state], k], next_state] += prob
+    return matrix
+
+
+def plate_appearance_matrices(lineup, params):
+    """
+    The steal attempts followed by the swing, for every batter in the lineup
+    :return: array[batter, state, runs, next_state]
+    """
+    tables = transitions.build_arrays(params)
+    steal = event_matrix(tables, STEAL)[:, :, :NR_STATES]
+    events = np.array([event_matrix(tables, event) for event in range(STEAL)])
+    matrices = np.zeros((len(lineup), NR_STATES, MAX_PA_RUNS + 1, NR_STATES + 1))
+    for i, batter in enumerate(lineup):
+        probs = np.asarray(batter.probs, dtype=float)
+        swing = np.tensordot(probs / probs.sum(), events, axes=1)
+        # a steal of home can only add one run
+        for steal_runs in (0, 1):
+            matrices[i, :, steal_runs:] += np.einsum(
+                'sm,mrt->srt', steal[:, steal_runs], swing[:, :MAX_PA_RUNS + 1 - steal_runs])
+    return matrices
+
+
+def inning_distributions(lineup, params, max_runs=MAX_INNING_RUNS, tol=1e-15):
+    """
+    :return: dist[leadoff, runs, next_leadoff], runs above max_runs
+                are counted as max_runs
+    """
+    nr_batters = len(lineup)
+    matrices = plate_appearance_matrices(lineup, params)
+    # [batter, (runs, next_state), state], to move all innings with one matmul
+    matrices = matrices.reshape(nr_batters, NR_STATES, -1).transpose(0, 2, 1)
+    leadoffs = np.arange(nr_batters)
+    dist = np.zeros((nr_batters, max_runs + 1, nr_batters))
+    # live[leadoff, state, runs] of the innings that are still going on
+    live = np.zeros((nr_batters, NR_STATES, max_runs + 1))
+    live[:, 0, 0] = 1.0
+    nr_pa = 0
+    while live.sum() > tol:
+        batter_up = (leadoffs + nr_pa) % nr_batters
+        moved = (matrices[batter_up] @ live).reshape(nr_batters, MAX_PA_RUNS + 1, NR_STATES + 1, -1)
+        step = moved[:, 0].copy()
+        for runs in range(1, MAX_PA_RUNS + 1):
+            step[:, :, runs:] += moved[:, runs, :, :max_runs + 1 - runs]
+            step[:, :, -1] += moved[:, runs, :, max_runs + 1 - runs:].sum(axis=2)
+        nr_pa += 1
+        dist[leadoffs, :, (leadoffs + nr_pa) % nr_batters] += step[:, NR_STATES]
+        live = step[:, :NR_STATES]
+    return dist
+
+
+@lru_cache(maxsize=INNING_CACHE_SIZE)
+def cached_inning_distributions(probs, params):
+    """
+    :param probs: tuple with the outcome probabilities of every batter
+    :param params: tuple of (name, value) of all Game parameters
+    :return: read-only dist[leadoff, runs, next_leadoff]
+    """
+    lineup = [Batter(probabilities=list(batter_probs)) for batter_probs in probs]
+    dist = inning_distributions(lineup, dict(params))
+    dist.setflags(write=False)
+    return dist
+
+
+def get_inning_distributions(lineup, game_params=None):
+    """
+    Same as inning_distributions, but cached by the probabilities of the
+    batters and the Game parameters.
+    :param game_params: dict with (some of) the probabilities that Game takes,
+                        the others get their default values
+    :return: read-only dist[leadoff, runs, next_leadoff]
+    """
+    if any(batter.baserunning for batter in lineup):
+        raise ValueError("the exact distributions do not know the baserunning of the batters, "
+                         "play the games with Game or BatchGame instead")
+    params = dict(transitions.DEFAULT_PARAMS)
+    for name in game_params or {}:
+        if name not in transitions.PARAM_NAMES:
+            raise ValueError(f"unknown Game parameter {name}")
+    params.update(game_params or {})
+    probs = tuple(tuple(float(p) for p in batter.probs) for batter in lineup)
+    return cached_inning_distributions(probs, tuple(sorted(params.items())))
+
+
+def exact_score_distribution(lineup, game_params=None, nr_innings=9):
+    """
+    Computes the exact distribution of the runs scored in one game.
+    :param lineup: list of Batters
+    :param game_params: dict with (some of) the probabilities that Game takes,
+                        the others get their default values
+    :return: a ScoreDistribution
+    """
+    return compose_innings(get_inning_distributions(lineup, game_params), nr_innings)
+
+
+def compose_innings(dist, nr_innings=9):
+    """
+    Chains the innings of a game, the first one led off by the first batter.
+    :param dist: dist[leadoff, runs, next_leadoff] of one inning
+    :return: ScoreDistribution of the runs in the game
+    """
+    max_runs = dist.shape[1] - 1
+
+    # game[leadoff, runs] after each inning
+    game = np.zeros((dist.shape[0], nr_innings * max_runs + 1))
+    game[0, 0] = 1.0
+    for inning in range(nr_innings):
+        total = inning * max_runs + 1
+        after = np.zeros_like(game)
+        for runs in range(max_runs + 1):
+            after[:, runs:runs + total] += dist[:, runs, :].T @ game[:, :total]
+        game = after
+    pmf = game.sum(axis=0)
+    return ScoreDistribution(np.trim_zeros(pmf, 'b'))
+
+
+def sample_scores(lineup, nr_games, nr_innings=9, rng=None, game_params=None):
+    """
+    Plays games by drawing the (runs, next leadoff) of every inning from the
+    cached inning distributions, instead of playing all plate appearances.
+    :return: array with the score of every game
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    dist = get_inning_distributions(lineup, game_params)
+    nr_batters, nr_runs = dist.shape[0], dist.shape[1]
+    # per leadoff, cumulative over the flattened (runs, next_leadoff)
+    cum_probs = np.cumsum(dist.reshape(nr_batters, -1), axis=1)
+    cum_probs /= cum_probs[:, -1:]
+    scores = np.zeros(nr_games, dtype=np.int32)
+    leadoff = np.zeros(nr_games, dtype=np.intp)
+    for inning in range(nr_innings):
+        u = rng.random(nr_games)
+        outcome = np.zeros(nr_games, dtype=np.intp)
+        for batter in range(nr_batters):
+            lanes = np.flatnonzero(leadoff == batter)
+            outcome[lanes] = np.searchsorted(cum_probs[batter], u[lanes], side='right')
+        outcome = np.minimum(outcome, nr_runs * nr_batters - 1)
+        scores += (outcome // nr_batters).astype(np.int32)
+        leadoff = outcome % nr_batters
+    return scores
@@ -0,0 +1,129 @@
+"""
+Head-to-head win probabilities of many lineups.
+
+Instead of playing every pair of lineups against each other, the run
+distribution of every lineup is computed once (exactly with markov, or
+simulated with BatchGame, which lineups with their own baserunning need), and
+the win, tie and loss probabilities of all pairs follow from those distributions:
+P(A beats B) = sum over a of P(A = a) * P(B < a), for all pairs in one matrix
+product. The runs of the two lineups are taken to be independent, as they are
+in the simulator.
+
+Ties can be played out in extra innings, each with the run distribution of one
+inning of the lineup (led off by the batter that would lead off the 10th).
+"""
+import numpy as np
+from batch import BatchGame
+from markov import exact_score_distribution, get_inning_distributions
+
+
+def pad(pmfs):
+    """ :return: array with one pmf per row, padded with zeros to the same length """
+    table = np.zeros((len(pmfs), max(len(pmf) for pmf in pmfs)))
+    for i, pmf in enumerate(pmfs):
+        table[i, :len(pmf)] = pmf
+    return table
+
+
+def win_tie_loss(pmfs, inning_pmfs=None, extra_innings=0):
+    """
+    :param pmfs: list with the run pmf of a game of every lineup
+    :param inning_pmfs: list with the run pmf of one extra inning of every lineup
+    :param extra_innings: max nr of extra innings to play after a tie, np.inf
+                            to play until there is a winner
+    :return: win, tie, loss: arrays where win[i, j] is the probability that
+                lineup i beats lineup j
+    """
+    runs = pad(pmfs)
+    # below[j, r] = P(runs of j < r)
+    below = np.cumsum(runs, axis=1) - runs
+    win = runs @ below.T
+    tie = runs @ runs.T
+    if extra_innings > 0:
+        inning_runs = pad(inning_pmfs)
+        inning_win = inning_runs @ (np.cumsum(inning_runs, axis=1) - inning_runs).T
+        inning_tie = inning_runs @ inning_runs.T
+        # the probability that one of the extra innings decides the game,
+        # per decisive inning: (1 - t^k) / (1 - t)
+        still_tied = inning_tie ** extra_innings
+        decided = np.divide(1 - still_tied, 1 - inning_tie,
+                            out=np.zeros_like(inning_tie), where=inning_tie < 1)
+        win = win + tie * inning_win * decided
+        tie = tie * still_tied
+    return win, tie, win.T.copy()
+
+
+class Matchups:
+    def __init__(self, game_params=None, nr_games=None, rng=None, batch_size=1_000_000, extra_innings=0):
+        """
+        :param game_params: dict with (some of) the probabilities that Game takes
+        :param nr_games: nr of games to simulate per lineup, or None for the
+                            exact distributions, which do not work for lineups
+                            with Batter.baserunning
+        :param extra_innings: see win_tie_loss
+        """
+        self.game_params = game_params or {}
+        self.nr_games = nr_games
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.batch_size = batch_size
+        self.extra_innings = extra_innings
+        self.names = []
+        self.pmfs = []
+        self.inning_pmfs = []
+
+    def add(self, lineup, name=None):
+        """ Computes (or simulates) the run distributions of one more lineup. """
+        if self.nr_games is None and any(batter.baserunning for batter in lineup):
+            raise ValueError("lineups with baserunning have to be simulated, give Matchups a nr_games")
+        if self.nr_games is None:
+            pmf, inning_pmf = self.exact_pmfs(lineup)
+        else:
+            pmf, inning_pmf = self.simulated_pmfs(lineup)
+        self.add_pmfs(pmf, inning_pmf, name)
+
+    def add_pmfs(self, pmf, inning_pmf=None, name=None):
+        """ Adds a lineup of which the run distributions are already known. """
+        self.names.append(f"Lineup{len(self.names) + 1}" if name is None else name)
+        self.pmfs.append(np.asarray(pmf, dtype=float))
+        self.inning_pmfs.append(np.ones(1) if inning_pmf is None else np.asarray(inning_pmf, dtype=float))
+
+    def exact_pmfs(self, lineup, nr_innings=9):
+        dist = get_inning_distributions(lineup, self.game_params)
+        # who leads off the 10th inning
+        leadoff = np.zeros(dist.shape[0])
+        leadoff[0] = 1.0
+        next_leadoff = dist.sum(axis=1)
+        for inning in range(nr_innings):
+            leadoff = leadoff @ next_leadoff
+        inning_pmf = leadoff @ dist.sum(axis=2)
+        return exact_score_distribution(lineup, self.game_params, nr_innings).pmf, np.trim_zeros(inning_pmf, 'b')
+
+    def simulated_pmfs(self, lineup):
+        runs = np.zeros(1, dtype=np.int64)
+        # the runs of the last inning, for the extra innings
+        inning_runs = np.zeros(1, dtype=np.int64)
+        for start in range(0, self.nr_games, self.batch_size):
+            games = min(self.batch_size, self.nr_games - start)
+            batch = BatchGame(lineup, games, rng=self.rng, details=True, **self.game_params)
+            batch.play()
+            details = batch.get_details()
+            runs = add_counts(runs, np.bincount(details['runs']))
+            inning_runs = add_counts(inning_runs, np.bincount(details['inning_runs'][:, -1]))
+        return runs / self.nr_games, inning_runs / self.nr_games
+
+    def matrices(self):
+        """ :return: win, tie, loss arrays of all lineups added, see win_tie_loss """
+        return win_tie_loss(self.pmfs, self.inning_pmfs, self.extra_innings)
+
+    def table(self):
+        """ :return: pandas DataFrame with the win probability of every row lineup against every column lineup """
+        import pandas as pd
+        win, tie, loss = self.matrices()
+        return pd.DataFrame(win, index=self.names, columns=self.names)
+
+
+def add_counts(counts, more):
+    if len(more) > len(counts):
+        counts = np.pad(counts, (0, len(more) - len(counts)))
+    counts[:len(more)] += more
+    return counts
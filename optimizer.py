@@ -0,0 +1,179 @@
+"""
+Search for the best batting order of nine players.
+
+All 9! orders are raced against each other with successive halving: every
+round only the best 1/eta of the orders go on to the next round, where they
+play more games until they have eta times as many. The
+orders are simulated in chunks with BatchGame, spread over a process pool.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import permutations
+import json
+import os
+import time
+import numpy as np
+from batch import BatchGame
+from batter import Batter
+from player_store import PlayerStore
+
+
+def _evaluate_chunk(probs, orders, nr_games, game_params, seed):
+    """
+    Plays nr_games games for each of the batting orders
+    :return: sum and sum of squares of the scores, per order
+    """
+    lineup = [Batter(probabilities=p) for p in probs]
+    batch = BatchGame(lineup, len(orders) * nr_games, rng=np.random.default_rng(seed),
+                      orders=np.repeat(orders, nr_games, axis=0), **game_params)
+    batch.play()
+    scores = batch.get_scores().reshape(len(orders), nr_games).astype(float)
+    return scores.sum(axis=1), (scores ** 2).sum(axis=1)
+
+
+class Race:
+    """ Running score statistics of all candidate orders, can be checkpointed. """
+    def __init__(self, orders, settings=None):
+        """
+        :param settings: dict with the inputs of the race, a checkpoint is only
+                            resumed with the same settings
+        """
+        self.orders = orders
+        self.settings = settings or {}
+        self.alive = np.arange(len(orders))
+        self.round = 0
+        self.nr_games = np.zeros(len(orders))
+        self.sum = np.zeros(len(orders))
+        self.sum_sq = np.zeros(len(orders))
+        # which of the alive orders already played this round
+        self.done = np.zeros(len(orders), dtype=bool)
+
+    def means(self, idx):
+        return self.sum[idx] / np.maximum(self.nr_games[idx], 1)
+
+    def confidence_intervals(self, idx, z=1.96):
+        n = np.maximum(self.nr_games[idx], 1)
+        mean = self.means(idx)
+        var = np.maximum(self.sum_sq[idx] / n - mean ** 2, 0) * n / np.maximum(n - 1, 1)
+        half = z * np.sqrt(var / n)
+        return mean - half, mean + half
+
+    def save(self, path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, orders=self.orders, settings=json.dumps(self.settings, sort_keys=True),
+                 alive=self.alive, round=self.round, nr_games=self.nr_games, sum=self.sum,
+                 sum_sq=self.sum_sq, done=self.done)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        settings = json.loads(str(data['settings'])) if 'settings' in data else None
+        race = cls(data['orders'], settings)
+        race.alive = data['alive']
+        race.round = int(data['round'])
+        race.nr_games = data['nr_games']
+        race.sum = data['sum']
+        race.sum_sq = data['sum_sq']
+        race.done = data['done']
+        return race
+
+
+def optimize_lineup(player_ids, dataset=None, top_k=10, initial_games=16, eta=4,
+                    final_games=20_000, workers=None, lanes_per_task=200_000,
+                    seed=0, checkpoint=None, checkpoint_every=60, game_params=None):
+    """
+    Finds the batting orders of the given players that score the most runs.
+    :param player_ids: the nine player ids, as in the Excel sheet
+    :param dataset: pandas dataframe of the Excel sheet, the cached
+                    PlayerStore of mlb2019.xls is used if not given
+    :param top_k: how many of the best orders to report
+    :param initial_games: games per order in the first round
+    :param eta: each round keeps 1/eta of the orders, which play up to eta
+                times as many games in total
+    :param final_games: games per order for the top_k at the end, and the
+                        most any order plays
+    :param workers: size of the process pool (default: all cores)
+    :param checkpoint: path of a .npz file to save progress to, and resume from
+    :param game_params: dict with the probabilities that Game takes
+    :return: list of (order of player ids, mean score, (ci low, ci high), games)
+    """
+    assert len(player_ids) == 9
+    if dataset is None:
+        probs = np.array([PlayerStore().get_probs(i) for i in player_ids])
+    else:
+        probs = np.array([Batter(player_id=i, dataset=dataset).probs for i in player_ids], dtype=float)
+    game_params = game_params or {}
+    # through json, so that they compare equal to the ones of a checkpoint
+    settings = json.loads(json.dumps({
+        'player_ids': list(player_ids), 'probs': probs.tolist(), 'game_params': game_params,
+        'seed': seed, 'top_k': top_k, 'initial_games': initial_games, 'eta': eta,
+        'final_games': final_games}, sort_keys=True))
+
+    if checkpoint is not None and os.path.exists(checkpoint):
+        race = Race.load(checkpoint)
+        if race.settings != settings:
+            different = sorted(name for name in settings if race.settings.get(name) != settings[name])
+            raise ValueError(f"checkpoint {checkpoint} is of a race with other settings "
+                             f"({', '.join(different)}), use another checkpoint file")
+        print(f"Resuming from {checkpoint}, round {race.round}, {len(race.alive)} orders left")
+    else:
+        race = Race(np.array(list(permutations(range(9))), dtype=np.int8), settings)
+
+    last_save = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            final = len(race.alive) <= top_k
+            target = final_games if final else min(initial_games * eta ** race.round, final_games)
+            # all orders that did not play yet this round played the same number of games
+            todo = race.alive[~race.done[race.alive]]
+            games = int(target - race.nr_games[todo].max()) if len(todo) else 0
+            print(f"Round {race.round}: {len(race.alive)} orders, {target} games each")
+
+            per_task = max(1, lanes_per_task // max(games, 1))
+            chunks = [todo[i:i + per_task] for i in range(0, len(todo), per_task)] if games else []
+            futures = {}
+            for chunk in chunks:
+                # seeded by round and first order, independent of the scheduling
+                chunk_seed = np.random.SeedSequence(seed, spawn_key=(race.round, int(chunk[0])))
+                future = pool.submit(_evaluate_chunk, probs, race.orders[chunk],
+                                     games, game_params, chunk_seed)
+                futures[future] = chunk
+            for future in as_completed(futures):
+                chunk = futures[future]
+                sums, sums_sq = future.result()
+                race.sum[chunk] += sums
+                race.sum_sq[chunk] += sums_sq
+                race.nr_games[chunk] += games
+                race.done[chunk] = True
+                if checkpoint is not None and time.time() - last_save > checkpoint_every:
+                    race.save(checkpoint)
+                    last_save = time.time()
+
+            if final:
+                break
+            # successive halving: keep the best 1/eta
+            keep = max(top_k, int(np.ceil(len(race.alive) / eta)))
+            ranking = np.argsort(-race.means(race.alive), kind='stable')
+            race.alive = np.sort(race.alive[ranking[:keep]])
+            race.done[:] = False
+            race.round += 1
+            if checkpoint is not None:
+                race.save(checkpoint)
+                last_save = time.time()
+
+    if checkpoint is not None:
+        race.save(checkpoint)
+    best = race.alive[np.argsort(-race.means(race.alive), kind='stable')]
+    low, high = race.confidence_intervals(best)
+    results = []
+    for i, idx in enumerate(best):
+        order = [player_ids[p] for p in race.orders[idx]]
+        results.append((order, race.means(idx), (low[i], high[i]), int(race.nr_games[idx])))
+    return results
+
+
+def print_results(results):
+    print(f"\nThe best {len(results)} batting orders are:")
+    for rank, (order, mean, (low, high), games) in enumerate(results, start=1):
+        print(f"{rank:>3}. {mean:.3f} runs  (95% CI {low:.3f} - {high:.3f}, {games} games)  "
+              f"{', '.join(order)}")
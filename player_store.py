@@ -0,0 +1,121 @@
+"""
+Cache of the outcome probabilities of every player in the Excel sheet.
+
+Reading mlb2019.xls takes seconds, so the probabilities of all players are
+computed once and saved next to it: a .npy file with one row per player
+and a small json index from player id to row. The cache is rebuilt when the
+sheet changes (checked by size and mtime, then by its hash).
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from batter import Batter, compute_probs_table
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def file_info(path):
+    """ :return: dict with the size, mtime and hash of a file, see file_status """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': file_hash(path)}
+
+
+def file_status(path, info):
+    """
+    Checks whether a file is still the same as when file_info was taken, by
+    size and mtime, then by its hash.
+    :return: 'same', 'touched' (same content, info['mtime'] is then updated)
+                or 'changed'
+    """
+    stat = os.stat(path)
+    if (info['size'], info['mtime']) == (stat.st_size, stat.st_mtime):
+        return 'same'
+    if info['size'] != stat.st_size or info['hash'] != file_hash(path):
+        return 'changed'
+    info['mtime'] = stat.st_mtime
+    return 'touched'
+
+
+def save_array(path, array):
+    """
+    np.save at once, so that a reader that memory-maps the old file (another
+    process) keeps seeing the old array instead of a half-written one.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def write_json(path, data):
+    """ Writes a json file at once, so that it is never half written. """
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class PlayerStore:
+    def __init__(self, source="mlb2019.xls"):
+        self.source = source
+        self.probs_path = source + ".probs.npy"
+        self.index_path = source + ".index.json"
+        if not self.load():
+            self.build()
+
+    def load(self):
+        """
+        Loads the cache if it is still valid.
+        :return: False if it has to be rebuilt
+        """
+        if not (os.path.exists(self.probs_path) and os.path.exists(self.index_path)):
+            return False
+        with open(self.index_path) as f:
+            index = json.load(f)
+        status = file_status(self.source, index)
+        if status == 'changed':
+            return False
+        if status == 'touched':
+            write_json(self.index_path, index)
+        self.use_index(index)
+        return True
+
+    def build(self):
+        import pandas as pd
+        dataset = pd.read_excel(self.source, sheet_name=0, header=0)
+        probs = compute_probs_table(dataset)
+        save_array(self.probs_path, probs)
+        index = {
+            **file_info(self.source),
+            'ids': dataset['playerID'].tolist(),
+            'names': (dataset['nameFirst'] + " " + dataset['nameLast']).tolist(),
+        }
+        write_json(self.index_path, index)
+        self.use_index(index)
+
+    def use_index(self, index):
+        self.probs = np.load(self.probs_path, mmap_mode='r')
+        self.names = index['names']
+        # the first row of a player, like compute_probs_from_dataset
+        self.rows = {}
+        for row, player_id in enumerate(index['ids']):
+            self.rows.setdefault(player_id, row)
+
+    def get_probs(self, player_id):
+        return list(self.probs[self.rows[player_id]])
+
+    def get_name(self, player_id):
+        return self.names[self.rows[player_id]]
+
+    def batter(self, player_id):
+        return Batter(probabilities=self.get_probs(player_id), name=self.get_name(player_id))
+
+    def lineup(self, player_ids):
+        return [self.batter(player_id) for player_id in player_ids]
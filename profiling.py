@@ -0,0 +1,116 @@
+"""
+Opt-in counters and timings of what happens inside a Game.
+
+Give a Game a GameProfile (Game(lineup, profile=GameProfile())) and it counts
+every kind of event (strike_out, ..., double_play, sac_fly_or_bunt, each kind
+of steal), the random numbers it draws, and times one in every sample_every
+events. A Game without a profile runs the same code as before, the profiled
+methods are only swapped in when a profile is given.
+"""
+from transitions import BRANCHES
+
+# what a steal attempt is counted as when no runner went
+NO_STEAL = 'no_steal'
+# the time a batter takes to swing, Batter.swing_code
+SWING = 'swing'
+
+KINDS = ('strike_out', 'in_play_out', 'sac_fly_or_bunt', 'double_play', 'walk',
+         'single', 'double', 'triple', 'homerun',
+         'steal_2nd', 'steal_3rd', 'double_steal', 'steal_home', NO_STEAL)
+
+# branches that are picked with a random number, the others are certain
+RANDOM_BRANCHES = {branch for event in BRANCHES for row in event for branches in row
+                   if len(branches) > 1 for branch in branches}
+
+
+class GameProfile:
+    def __init__(self, sample_every=97):
+        """
+        :param sample_every: time one in this many events (and swings), 0 to
+                                only count. Best not a multiple of 3, the
+                                nr of events per plate appearance.
+        """
+        self.sample_every = sample_every
+        self.countdown = sample_every
+        # per branch of the transition table, the kinds are counted from these
+        self.branch_counts = {}
+        self.nr_swings = 0
+        # timed events per kind of event (the last kind of its branch), and SWING
+        self.nr_samples = dict.fromkeys(KINDS + (SWING,), 0)
+        self.sampled_time = dict.fromkeys(KINDS + (SWING,), 0.0)
+
+    def take_sample(self):
+        """ True for one in every sample_every calls. """
+        self.countdown -= 1
+        if self.countdown == 0:
+            self.countdown = self.sample_every
+            return True
+        return False
+
+    def count(self, branch):
+        """ Counts one event, given the branch of the transition table it took. """
+        self.branch_counts[branch] = self.branch_counts.get(branch, 0) + 1
+
+    def get_counts(self):
+        """ :return: dict with the nr of events of each kind """
+        counts = dict.fromkeys(KINDS, 0)
+        for branch, count in self.branch_counts.items():
+            for kind in branch.kinds or (NO_STEAL,):
+                counts[kind] += count
+        return counts
+
+    def get_rng_draws(self):
+        """ Random numbers drawn: one per swing, and one per event that had more than one branch. """
+        return self.nr_swings + sum(count for branch, count in self.branch_counts.items()
+                                    if branch in RANDOM_BRANCHES)
+
+    def add_time(self, kind, seconds):
+        self.nr_samples[kind] += 1
+        self.sampled_time[kind] += seconds
+
+    def time_branch(self, branch, seconds):
+        self.add_time(branch.kinds[-1] if branch.kinds else NO_STEAL, seconds)
+
+    def merge(self, other):
+        """ Adds the counts and timings of another GameProfile to this one. """
+        for branch, count in other.branch_counts.items():
+            self.branch_counts[branch] = self.branch_counts.get(branch, 0) + count
+        for kind in self.nr_samples:
+            self.nr_samples[kind] += other.nr_samples[kind]
+            self.sampled_time[kind] += other.sampled_time[kind]
+        self.nr_swings += other.nr_swings
+
+    def snapshot(self):
+        """
+        :return: dict with the counts per kind of event, the nr of swings and
+                    random numbers drawn, and per kind that was timed the
+                    mean time of the samples and the estimated total time
+        """
+        timing = {}
+        for kind, nr_samples in self.nr_samples.items():
+            if nr_samples == 0:
+                continue
+            # every sample stands for sample_every events
+            timing[kind] = {'samples': nr_samples,
+                            'mean_seconds': self.sampled_time[kind] / nr_samples,
+                            'estimated_seconds': self.sampled_time[kind] * self.sample_every}
+        return {
+            'counts': self.get_counts(),
+            'nr_swings': self.nr_swings,
+            'rng_draws': self.get_rng_draws(),
+            'timing': timing,
+        }
+
+    def report(self):
+        """ The snapshot as a table. """
+        snapshot = self.snapshot()
+        lines = [f"{'event':<16} {'count':>12} {'mean time':>12} {'est. total':>12}"]
+        rows = list(snapshot['counts'].items()) + [(SWING, self.nr_swings)]
+        for kind, count in rows:
+            line = f"{kind:<16} {count:>12}"
+            if kind in snapshot['timing']:
+                timing = snapshot['timing'][kind]
+                line += f" {timing['mean_seconds'] * 1e6:>9.2f} us {timing['estimated_seconds']:>10.3f} s"
+            lines.append(line)
+        lines.append(f"{'rng draws':<16} {snapshot['rng_draws']:>12}")
+        return "\n".join(lines)
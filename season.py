@@ -0,0 +1,240 @@
+"""
+Projections of whole seasons for all teams of the Excel sheet.
+
+Every team gets the lineup of its nine players with the most plate
+appearances. A season is a schedule of rounds in which every team plays once
+(162 games per team), and many seasons are played at once: every game is two
+lanes of one large BatchGame (one per team), with the batting order of each
+lane pointing into the combined lineup of all teams. Tied games get extra
+innings until there is a winner, the batting order goes on where it stopped.
+
+The results go into fixed-size accumulators per team (wins per season, runs
+scored and allowed, runs per game), so the memory does not grow with the nr of
+seasons.
+
+Usage: python season.py [--seasons 1000] [--workers 8] [--seed 0]
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch import BatchGame
+from batter import Batter, compute_probs_table
+
+GAMES_PER_TEAM = 162
+# runs per game above this are counted as this many in the histogram
+MAX_GAME_RUNS = 40
+
+
+def team_lineups(source="mlb2019.xls"):
+    """
+    :return: dict of team id -> lineup of the nine players of that team with
+                the most plate appearances, in that order
+    """
+    import pandas as pd
+    dataset = pd.read_excel(source, sheet_name=0, header=0)
+    probs = compute_probs_table(dataset)
+    lineups = {}
+    for team, players in dataset.groupby('teamID'):
+        players = players.sort_values('tap', ascending=False, kind='stable')[:9]
+        assert len(players) == 9, f"team {team} has less than nine players"
+        lineups[team] = [Batter(probabilities=probs[row].tolist(), name=f"{first} {last}")
+                         for row, first, last in zip(players.index, players['nameFirst'], players['nameLast'])]
+    return lineups
+
+
+def schedule(nr_teams, games_per_team=GAMES_PER_TEAM):
+    """
+    Rounds of a round robin (circle method) one after the other, as many as
+    every team has games.
+    :return: home, away: arrays with the teams of every game of a season
+    """
+    assert nr_teams % 2 == 0, "the schedule needs an even nr of teams"
+    teams = list(range(nr_teams))
+    home, away = [], []
+    for game_round in range(games_per_team):
+        rotation = game_round % (nr_teams - 1)
+        circle = [teams[0]] + teams[1:][rotation:] + teams[1:][:rotation]
+        for i in range(nr_teams // 2):
+            first, second = circle[i], circle[-1 - i]
+            # switch home and away every round
+            if game_round % 2:
+                first, second = second, first
+            home.append(first)
+            away.append(second)
+    return np.array(home), np.array(away)
+
+
+class SeasonStats:
+    def __init__(self, nr_teams, games_per_team=GAMES_PER_TEAM):
+        self.nr_teams = nr_teams
+        self.nr_seasons = 0
+        # wins[team, k] is the nr of seasons in which the team won k games
+        self.wins = np.zeros((nr_teams, games_per_team + 1), dtype=np.int64)
+        # runs[team, r] is the nr of games in which the team scored r runs
+        self.runs = np.zeros((nr_teams, MAX_GAME_RUNS + 1), dtype=np.int64)
+        self.runs_scored = np.zeros(nr_teams)
+        self.runs_allowed = np.zeros(nr_teams)
+        # seasons with the most wins of all teams, shared between teams that tie
+        self.most_wins = np.zeros(nr_teams)
+
+    def add_seasons(self, wins, runs_scored, runs_allowed, game_runs, teams):
+        """
+        :param wins, runs_scored, runs_allowed: arrays of shape (nr of seasons, nr_teams)
+        :param game_runs: the runs of every team in every game
+        :param teams: the team of every entry of game_runs
+        """
+        nr_wins = self.wins.shape[1]
+        self.wins += np.bincount((np.arange(self.nr_teams) * nr_wins + wins).ravel(),
+                                 minlength=self.wins.size).reshape(self.wins.shape)
+        nr_runs = self.runs.shape[1]
+        self.runs += np.bincount(teams * nr_runs + np.minimum(game_runs, MAX_GAME_RUNS),
+                                 minlength=self.runs.size).reshape(self.runs.shape)
+        self.runs_scored += runs_scored.sum(axis=0)
+        self.runs_allowed += runs_allowed.sum(axis=0)
+        best = wins == wins.max(axis=1, keepdims=True)
+        self.most_wins += (best / best.sum(axis=1, keepdims=True)).sum(axis=0)
+        self.nr_seasons += len(wins)
+
+    def merge(self, other):
+        self.wins += other.wins
+        self.runs += other.runs
+        self.runs_scored += other.runs_scored
+        self.runs_allowed += other.runs_allowed
+        self.most_wins += other.most_wins
+        self.nr_seasons += other.nr_seasons
+
+    def mean_wins(self):
+        return self.wins @ np.arange(self.wins.shape[1]) / self.nr_seasons
+
+    def std_wins(self):
+        mean_sq = self.wins @ np.arange(self.wins.shape[1]) ** 2 / self.nr_seasons
+        return np.sqrt(np.maximum(mean_sq - self.mean_wins() ** 2, 0))
+
+    def table(self, teams):
+        """
+        :param teams: the names of the teams
+        :return: pandas DataFrame with the mean and std of the wins, the runs
+                    scored and allowed per season and the share of seasons
+                    with the most wins, best teams first
+        """
+        import pandas as pd
+        table = pd.DataFrame({
+            'wins': self.mean_wins(),
+            'std': self.std_wins(),
+            'runs_scored': self.runs_scored / self.nr_seasons,
+            'runs_allowed': self.runs_allowed / self.nr_seasons,
+            'most_wins': self.most_wins / self.nr_seasons,
+        }, index=list(teams))
+        return table.sort_values('wins', ascending=False)
+
+
+def play_season_batch(players, orders, home, away, nr_seasons, rng, game_params=None):
+    """
+    Plays all games of nr_seasons seasons in one BatchGame.
+    :param players: the combined lineup of all teams
+    :param orders: orders[team], the indices of the batters of a team in players
+    :param home, away: the teams of every game of a season, see schedule
+    :return: SeasonStats of the seasons
+    """
+    game_params = game_params or {}
+    nr_teams = len(orders)
+    nr_games = len(home) * nr_seasons
+    teams = np.concatenate([np.tile(home, nr_seasons), np.tile(away, nr_seasons)])
+    batch = BatchGame(players, len(teams), rng=rng, orders=orders[teams], **game_params)
+    batch.play()
+    scores = batch.get_scores().astype(np.int64)
+    home_runs, away_runs = scores[:nr_games], scores[nr_games:]
+    # who leads off the next inning, per lane
+    next_batters = batch.get_next_batters().copy()
+
+    tied = np.flatnonzero(home_runs == away_runs)
+    while len(tied):
+        lanes = np.concatenate([tied, nr_games + tied])
+        extra = BatchGame(players, len(lanes), nr_innings=1, rng=rng, orders=orders[teams[lanes]],
+                          leadoffs=next_batters[lanes], **game_params)
+        extra.play()
+        next_batters[lanes] = extra.get_next_batters()
+        extra_runs = extra.get_scores()
+        home_runs[tied] += extra_runs[:len(tied)]
+        away_runs[tied] += extra_runs[len(tied):]
+        tied = tied[home_runs[tied] == away_runs[tied]]
+
+    season = np.repeat(np.arange(nr_seasons), len(home))
+    home_teams, away_teams = teams[:nr_games], teams[nr_games:]
+    winners = np.where(home_runs > away_runs, home_teams, away_teams)
+
+    def per_season(team, values=None):
+        return np.bincount(season * nr_teams + team, values,
+                           minlength=nr_seasons * nr_teams).reshape(nr_seasons, nr_teams)
+
+    stats = SeasonStats(nr_teams, GAMES_PER_TEAM)
+    stats.add_seasons(per_season(winners),
+                      per_season(home_teams, home_runs) + per_season(away_teams, away_runs),
+                      per_season(home_teams, away_runs) + per_season(away_teams, home_runs),
+                      scores, teams)
+    return stats
+
+
+def play_seasons(lineups, nr_seasons=1_000, batch_size=1_000_000, rng=None, game_params=None, progress=False):
+    """
+    :param lineups: list with the lineup of every team
+    :param batch_size: max nr of lanes per BatchGame, two per game
+    :return: SeasonStats of all seasons
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    players = [batter for lineup in lineups for batter in lineup]
+    orders = np.arange(len(players)).reshape(len(lineups), 9)
+    home, away = schedule(len(lineups))
+    seasons_per_batch = max(1, batch_size // (2 * len(home)))
+    stats = SeasonStats(len(lineups), GAMES_PER_TEAM)
+    for start in range(0, nr_seasons, seasons_per_batch):
+        seasons = min(seasons_per_batch, nr_seasons - start)
+        stats.merge(play_season_batch(players, orders, home, away, seasons, rng, game_params))
+        if progress:
+            print(f"Played {start + seasons} of {nr_seasons} seasons")
+    return stats
+
+
+def _play_shard(lineups, nr_seasons, batch_size, seed, game_params):
+    return play_seasons(lineups, nr_seasons, batch_size, np.random.default_rng(seed), game_params)
+
+
+def play_sharded_seasons(lineups, nr_seasons=1_000, workers=4, batch_size=1_000_000, seed=None,
+                         game_params=None):
+    """ Same as play_seasons, with the seasons split over a process pool. """
+    shards = [len(shard) for shard in np.array_split(np.arange(nr_seasons), workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shard_stats = list(pool.map(_play_shard, [lineups] * workers, shards, [batch_size] * workers,
+                                    seeds, [game_params] * workers))
+    stats = SeasonStats(len(lineups), GAMES_PER_TEAM)
+    for shard in shard_stats:
+        stats.merge(shard)
+    return stats
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Plays many seasons of all teams in the Excel sheet")
+    parser.add_argument('--seasons', type=int, default=1_000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=1_000_000)
+    parser.add_argument('--source', default="mlb2019.xls", help="Excel sheet with the players")
+    args = parser.parse_args(args)
+
+    lineups = team_lineups(args.source)
+    start = time.perf_counter()
+    if args.workers is None:
+        stats = play_seasons(list(lineups.values()), args.seasons, args.batch_size,
+                             np.random.default_rng(args.seed), progress=True)
+    else:
+        stats = play_sharded_seasons(list(lineups.values()), args.seasons, args.workers,
+                                     args.batch_size, args.seed)
+    print(f"Played {stats.nr_seasons} seasons of {len(lineups)} teams "
+          f"in {time.perf_counter() - start:.1f} seconds\n")
+    print(stats.table(lineups).to_string(float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == '__main__':
+    main()
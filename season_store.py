@@ -0,0 +1,146 @@
+"""
+Players of many seasons (and leagues) in one store, keyed by (player id, season).
+
+The season sheets (in the format of mlb2019.xls, from baseballguru.com) are
+read once. The number of plate appearances and of each outcome of every
+(player, season) is saved to a directory: a .npy file with one row per
+(player, season) and a json index. Rows of the same player and season (like
+stints at different teams) are added up. The store is rebuilt when one of the
+sheets changes.
+
+The probabilities of a player can then be taken from one season, or blended
+over several seasons weighted by plate appearances: all outcomes of those
+seasons added up, divided by all plate appearances. Blends are cached.
+"""
+import json
+import os
+import numpy as np
+from batter import Batter, compute_counts_table
+from player_store import file_info, file_status, save_array, write_json
+
+
+class SeasonStore:
+    def __init__(self, sources, path="seasons"):
+        """
+        :param sources: list of Excel sheets with a year column, or a dict of
+                        sheet -> season for sheets without it
+        :param path: directory to save the store in
+        """
+        if not isinstance(sources, dict):
+            sources = {source: None for source in sources}
+        self.sources = sources
+        self.path = path
+        self.counts_path = os.path.join(path, "counts.npy")
+        self.index_path = os.path.join(path, "index.json")
+        self.blends = {}
+        if not self.load():
+            self.build()
+
+    def load(self):
+        """
+        Loads the store if all sheets are the same as when it was built.
+        :return: False if it has to be rebuilt
+        """
+        if not (os.path.exists(self.counts_path) and os.path.exists(self.index_path)):
+            return False
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if set(index['sources']) != set(self.sources):
+            return False
+        touched = False
+        for source, info in index['sources'].items():
+            if info['season'] != self.sources[source]:
+                return False
+            status = file_status(source, info)
+            if status == 'changed':
+                return False
+            touched = touched or status == 'touched'
+        if touched:
+            write_json(self.index_path, index)
+        self.use_index(index)
+        return True
+
+    def build(self):
+        import pandas as pd
+        tables = []
+        for source, season in self.sources.items():
+            dataset = pd.read_excel(source, sheet_name=0, header=0)
+            plate_appears, counts = compute_counts_table(dataset)
+            table = pd.DataFrame(counts, columns=list(range(7)))
+            table.insert(0, 'tap', plate_appears)
+            table['playerID'] = dataset['playerID'].to_numpy()
+            table['season'] = dataset['year'].to_numpy(dtype=int) if season is None else season
+            table['name'] = (dataset['nameFirst'] + " " + dataset['nameLast']).to_numpy()
+            tables.append(table)
+        table = pd.concat(tables, ignore_index=True)
+        # stints of the same player in the same season are added up
+        numbers = ['tap'] + list(range(7))
+        table = table.groupby(['playerID', 'season'], sort=True).agg(
+            {**{column: 'sum' for column in numbers}, 'name': 'first'}).reset_index()
+
+        os.makedirs(self.path, exist_ok=True)
+        save_array(self.counts_path, table[numbers].to_numpy(dtype=float))
+        index = {
+            'sources': {source: {**file_info(source), 'season': season} for source, season in self.sources.items()},
+            'keys': [[player_id, int(season)] for player_id, season in zip(table['playerID'], table['season'])],
+            'names': table['name'].tolist(),
+        }
+        write_json(self.index_path, index)
+        self.use_index(index)
+
+    def use_index(self, index):
+        counts = np.load(self.counts_path)
+        self.plate_appears = counts[:, 0]
+        self.counts = counts[:, 1:]
+        # the probabilities of every (player, season), nan without plate appearances
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.probs = self.counts / self.plate_appears[:, None]
+        self.names = index['names']
+        self.rows = {}
+        self.seasons = {}
+        for row, (player_id, season) in enumerate(index['keys']):
+            self.rows[player_id, season] = row
+            self.seasons.setdefault(player_id, []).append(season)
+        self.blends = {}
+
+    def get_seasons(self, player_id, seasons=None, last=None):
+        """
+        :param seasons: the seasons to use, all seasons of the player if None
+        :param last: only the last this many of those
+        :return: sorted list of the seasons of the player
+        """
+        played = sorted(self.seasons[player_id])
+        if seasons is not None:
+            played = [season for season in played if season in set(seasons)]
+        if last is not None:
+            played = played[-last:]
+        if not played:
+            raise KeyError(f"no seasons of {player_id}")
+        return played
+
+    def get_probs(self, player_id, seasons=None, last=None):
+        """
+        Probabilities of the outcomes, blended over the seasons weighted by
+        plate appearances (see get_seasons for the arguments).
+        """
+        seasons = tuple(self.get_seasons(player_id, seasons, last))
+        key = (player_id, seasons)
+        if key not in self.blends:
+            rows = [self.rows[player_id, season] for season in seasons]
+            if len(rows) == 1:
+                probs = self.probs[rows[0]]
+            else:
+                probs = self.counts[rows].sum(axis=0) / self.plate_appears[rows].sum()
+            self.blends[key] = probs.tolist()
+        return self.blends[key]
+
+    def get_name(self, player_id):
+        season = max(self.seasons[player_id])
+        return self.names[self.rows[player_id, season]]
+
+    def batter(self, player_id, seasons=None, last=None):
+        return Batter(probabilities=self.get_probs(player_id, seasons, last), name=self.get_name(player_id))
+
+    def lineup(self, player_ids, seasons=None, last=None):
+        """ e.g. lineup(ids, last=3) for the last three seasons of every player """
+        return [self.batter(player_id, seasons, last) for player_id in player_ids]
@@ -0,0 +1,267 @@
+"""
+Local simulation service, for many people (or scripts) asking for the scores
+of lineups without each of them loading the player data and simulating the
+same lineups again.
+
+A small asyncio HTTP server, using nothing but the standard library and the
+simulator itself. Requests that come in at about the same time are played
+together in one BatchGame, each with its own common random numbers, so the
+result of a request only depends on its lineup, Game parameters, nr of games
+and seed. Results are kept in a cache of bounded size (least recently used
+ones are dropped first), and a request that is already being played is not
+played twice.
+
+    POST /simulate  {"player_ids": [nine ids]}  or  {"probs": [nine lists of 7]},
+                    optional: "nr_games" (10000), "seed" (0), "game_params" ({})
+    GET  /status    cache and batch statistics
+
+Usage: python service.py [--host 127.0.0.1] [--port 8765] [--cache-size 1024]
+"""
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib import request as urllib_request
+import numpy as np
+from batch import BatchGame, CombinedStreams, RandomStreams
+from batter import Batter
+from player_store import PlayerStore
+from stats import ScoreStats
+from transitions import PARAM_NAMES
+
+DEFAULT_PORT = 8765
+MAX_BODY_SIZE = 1 << 20
+
+
+class ResultCache:
+    """ Dict with at most max_entries items, drops the least recently used. """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key not in self.items:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_entries:
+            self.items.popitem(last=False)
+
+
+class SimulationRequest:
+    def __init__(self, probs, game_params, nr_games, seed):
+        """
+        :param probs: tuple with the outcome probabilities of the nine batters
+        :param game_params: tuple of (name, value) of the Game parameters given
+        """
+        self.probs = probs
+        self.game_params = game_params
+        self.nr_games = nr_games
+        self.seed = seed
+        self.key = (probs, game_params, nr_games, seed)
+        self.future = None
+
+
+def play_requests(requests):
+    """
+    Plays the games of all requests in one BatchGame, every request with its
+    own lineup, Game parameters and random streams.
+    :return: list with the result dict of every request
+    """
+    lineup = [Batter(probabilities=list(p)) for request in requests for p in request.probs]
+    nr_games = [request.nr_games for request in requests]
+    group = np.repeat(np.arange(len(requests)), nr_games)
+    orders = group[:, None] * 9 + np.arange(9)
+    streams = CombinedStreams([RandomStreams(request.seed, request.nr_games) for request in requests])
+    batch = BatchGame(lineup, len(group), orders=orders, streams=streams,
+                      param_sets=[dict(request.game_params) for request in requests], param_index=group)
+    batch.play()
+    results = []
+    for scores in np.split(batch.get_scores(), np.cumsum(nr_games)[:-1]):
+        stats = ScoreStats()
+        stats.add_scores(scores)
+        results.append(stats.to_dict())
+    return results
+
+
+class SimulationService:
+    def __init__(self, store=None, cache_size=1024, max_lanes=1_000_000,
+                 max_games=10_000_000, batch_window=0.01):
+        """
+        :param store: PlayerStore for the player ids, the one of mlb2019.xls if None
+        :param cache_size: nr of results to keep
+        :param max_lanes: games per BatchGame when playing several requests together
+        :param max_games: largest nr_games of a request
+        :param batch_window: seconds to wait for more requests to play together
+        """
+        self.store = PlayerStore() if store is None else store
+        self.cache = ResultCache(cache_size)
+        self.max_lanes = max_lanes
+        self.max_games = max_games
+        self.batch_window = batch_window
+        # the games are played on another thread, so the server keeps answering
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.in_flight = {}
+        self.pending = []
+        self.batcher = None
+        self.nr_batches = 0
+        self.nr_played = 0
+
+    def parse(self, body):
+        """
+        :param body: the json of a /simulate request, as a dict
+        :return: SimulationRequest
+        """
+        if 'player_ids' in body:
+            unknown = [player_id for player_id in body['player_ids'] if player_id not in self.store.rows]
+            if unknown:
+                raise ValueError(f"unknown player ids {', '.join(map(str, unknown))}")
+            probs = [self.store.get_probs(player_id) for player_id in body['player_ids']]
+        elif 'probs' in body:
+            probs = body['probs']
+        else:
+            raise ValueError("give player_ids or probs")
+        if len(probs) != 9 or any(len(p) != 7 for p in probs):
+            raise ValueError("a lineup has nine batters with 7 probabilities each")
+        game_params = body.get('game_params', {})
+        for name in game_params:
+            if name not in PARAM_NAMES:
+                raise ValueError(f"unknown Game parameter {name}")
+        nr_games = int(body.get('nr_games', 10_000))
+        if not 0 < nr_games <= self.max_games:
+            raise ValueError(f"nr_games should be between 1 and {self.max_games}")
+        return SimulationRequest(tuple(tuple(float(x) for x in p) for p in probs),
+                                 tuple(sorted((name, float(value)) for name, value in game_params.items())),
+                                 nr_games, int(body.get('seed', 0)))
+
+    async def simulate(self, request):
+        """ :return: result dict of the request, from the cache if possible """
+        result = self.cache.get(request.key)
+        if result is not None:
+            return result
+        if request.key in self.in_flight:
+            return await asyncio.shield(self.in_flight[request.key])
+        request.future = asyncio.get_running_loop().create_future()
+        self.in_flight[request.key] = request.future
+        self.pending.append(request)
+        if self.batcher is None or self.batcher.done():
+            self.batcher = asyncio.create_task(self.play_pending())
+        return await asyncio.shield(request.future)
+
+    async def play_pending(self):
+        """ Plays the pending requests, in groups of at most max_lanes games. """
+        await asyncio.sleep(self.batch_window)
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            group, lanes = [], 0
+            while self.pending and (not group or lanes + self.pending[0].nr_games <= self.max_lanes):
+                lanes += self.pending[0].nr_games
+                group.append(self.pending.pop(0))
+            try:
+                results = await loop.run_in_executor(self.executor, play_requests, group)
+            except Exception as error:
+                for request in group:
+                    del self.in_flight[request.key]
+                    request.future.set_exception(error)
+                continue
+            self.nr_batches += 1
+            self.nr_played += lanes
+            for request, result in zip(group, results):
+                self.cache.put(request.key, result)
+                del self.in_flight[request.key]
+                request.future.set_result(result)
+
+    def status(self):
+        return {
+            'cached_results': len(self.cache.items),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'batches': self.nr_batches,
+            'games_played': self.nr_played,
+            'pending': len(self.pending),
+        }
+
+    async def handle(self, method, path, body):
+        """ :return: http status, response dict """
+        if method == 'GET' and path == '/status':
+            return 200, self.status()
+        if method == 'POST' and path == '/simulate':
+            try:
+                request = self.parse(json.loads(body or b'{}'))
+            except (ValueError, KeyError, TypeError) as error:
+                return 400, {'error': str(error)}
+            return 200, await self.simulate(request)
+        return 404, {'error': f"no {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        """ One request per connection. """
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if len(request_line) < 2 or length > MAX_BODY_SIZE:
+                status, response = 400, {'error': "bad request"}
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, response = await self.handle(request_line[0], request_line[1], body)
+        except Exception as error:
+            status, response = 500, {'error': str(error)}
+        data = json.dumps(response).encode()
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+        await writer.drain()
+        writer.close()
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def simulate_remote(player_ids=None, probs=None, nr_games=10_000, seed=0, game_params=None,
+                    url=f"http://127.0.0.1:{DEFAULT_PORT}"):
+    """
+    Asks a running service for the scores of a lineup.
+    :return: dict with nr_games, mean, std, stderr, median and counts
+    """
+    body = {'nr_games': nr_games, 'seed': seed, 'game_params': game_params or {}}
+    if player_ids is not None:
+        body['player_ids'] = list(player_ids)
+    else:
+        body['probs'] = [list(p) for p in probs]
+    req = urllib_request.Request(url + '/simulate', data=json.dumps(body).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib_request.urlopen(req) as response:
+        return json.loads(response.read())
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Local baseball simulation service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=1024, help="nr of results to keep")
+    parser.add_argument('--source', default="mlb2019.xls", help="Excel sheet with the players")
+    args = parser.parse_args(args)
+    service = SimulationService(PlayerStore(args.source), cache_size=args.cache_size)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,34 @@ such that we can compare different lineup possibilities.
 
 by Bram Grooten
 """
+from concurrent.futures import ProcessPoolExecutor
 from batter import Batter
 from baseball import Game
-import pandas as pd
+from adaptive import play_until_precise
+from batch import BatchGame
+from markov import exact_score_distribution, sample_scores
+from player_store import PlayerStore
+from stats import ScoreStats, z_value
 import numpy as np
-import plotille
+
+
+MLB_LINEUP_IDS = [
+    'anderti01',
+    'bogaexa01',
+    'yelicch01',
+
+    'tatisfe02',
+    'deverra01',
+    'cruzne02',
+
+    'arenano01',
+    'blackch02',
+    'rendoan01',
+    ]
 
 
 def setup_mlb():
-    dataset = pd.read_excel("mlb2019.xls", sheet_name=0, header=0)
+    store = PlayerStore("mlb2019.xls")
     # marteke01
     # lemahdj01
     # moncayo01
@@ -20,25 +39,9 @@ def setup_mlb():
     # reynobr01
     # alvaryo01
     # brantmi02
-    lineup_id = [
-        'anderti01',
-        'bogaexa01',
-        'yelicch01',
-
-        'tatisfe02',
-        'deverra01',
-        'cruzne02',
-
-        'arenano01',
-        'blackch02',
-        'rendoan01',
-        ]
+    lineup_id = MLB_LINEUP_IDS
     assert len(lineup_id) == 9
-    lineup = []
-    for batter_id in lineup_id:
-        batter = Batter(player_id=batter_id, dataset=dataset)
-        lineup.append(batter)
-    return lineup
+    return store.lineup(lineup_id)
 
 
 def setup_own():
@@ -59,22 +62,154 @@ def setup_own():
     return lineup
 
 
-def play_many_games(lineup, nr_games=10_000):
+def play_many_games(lineup, nr_games=None, batch_size=None, workers=None, seed=None,
+                    target_stderr=None, confidence=None, profile=None, from_innings=False, store=None):
+    """
+    Simulates many games and prints statistics of the scores.
+    :param nr_games: 10_000 if None, with target_stderr the most games to
+                        play, then 100_000_000 if None
+    :param batch_size: if given, play the games in batches of this many
+                        lanes with the vectorized BatchGame engine
+    :param workers: if given, split the games over this many processes
+    :param seed: makes the results reproducible (for the same nr of workers)
+    :param target_stderr: if given, play batches of games until the half-width
+                            of the confidence interval of the mean is at most
+                            this, or until nr_games (not with workers)
+    :param confidence: e.g. 0.95 for target_stderr, the standard error if None
+    :param profile: profiling.GameProfile to count (and time) the events of
+                    the games in, printed at the end (only without batch_size,
+                    workers and target_stderr)
+    :param from_innings: compose the games from the cached distributions of
+                        (runs, next leadoff) of an inning, see
+                        markov.sample_scores, instead of playing every
+                        plate appearance (not with workers and target_stderr,
+                        nor for batters with their own baserunning)
+    :param store: game_store.GameStore to append the runs (per inning), plate
+                    appearances and outcomes of every game to, the games are
+                    then played with BatchGame (only without workers,
+                    target_stderr, profile and from_innings)
+    :return: ScoreStats of the games
+    """
     game = Game(lineup, printing=False)
     game.print_lineup()
-    scores = []
+    if profile is not None:
+        assert batch_size is None and workers is None and target_stderr is None, \
+            "profile only works with Game, not with batch_size, workers or target_stderr"
+    if nr_games is None:
+        nr_games = 10_000 if target_stderr is None else 100_000_000
+    if target_stderr is not None:
+        assert workers is None, "target_stderr can not be combined with workers"
+        stats = play_until_precise(lineup, target_stderr, confidence, batch_size or 10_000,
+                                   nr_games, np.random.default_rng(seed), progress=True)
+        if z_value(confidence) * stats.stderr() > target_stderr:
+            print(f"\nStopped at the maximum of {nr_games} games, before reaching the target of "
+                  f"{target_stderr}, give a larger nr_games")
+        nr_games = stats.nr_games
+    elif from_innings:
+        assert workers is None, "from_innings can not be combined with workers"
+        stats = play_inning_games(lineup, nr_games, batch_size or 1_000_000,
+                                  np.random.default_rng(seed), progress=True)
+    elif store is not None:
+        assert workers is None and profile is None, "store can not be combined with workers or profile"
+        stats = play_batched_games(lineup, nr_games, batch_size or 100_000, np.random.default_rng(seed),
+                                   progress=True, store=store)
+    elif workers is None:
+        stats = play_games(lineup, nr_games, batch_size, np.random.default_rng(seed), progress=True,
+                           profile=profile)
+    else:
+        stats = play_sharded_games(lineup, nr_games, workers, batch_size, seed)
+
+    print(f"\nAfter {nr_games} games we have:")
+    print(stats.report())
+    print(stats.histogram(width=50))
+    if profile is not None:
+        print("\nEvents:")
+        print(profile.report())
+    return stats
+
+
+def play_games(lineup, nr_games, batch_size=None, rng=None, progress=False, stats=None, profile=None):
+    """
+    Plays nr_games with Game, or with BatchGame if batch_size is given.
+    :param stats: ScoreStats to add the scores to, a new one if not given
+    :param profile: GameProfile for the Game
+    :return: the ScoreStats
+    """
+    stats = ScoreStats() if stats is None else stats
+    if batch_size is not None:
+        return play_batched_games(lineup, nr_games, batch_size, rng, progress, stats)
+    game = Game(lineup, printing=False, rng=rng, profile=profile)
     for game_idx in range(nr_games):
         game.reset_game_state()
         game.play()
-        scores.append(game.get_score())
-        if (game_idx + 1) % 1000 == 0:
+        stats.add(game.get_score())
+        if progress and (game_idx + 1) % 1000 == 0:
             print(f"Played {game_idx+1} games")
-
-    print(f"\nAfter {nr_games} games we have:")
-    print(f"avg score: \t{np.mean(scores)}")
-    print(f"median: \t{np.median(scores)}")
-    print(f"std dev: \t{np.std(scores):.2f}")
-    print(plotille.hist(scores, bins=int(np.max(scores)), width=50))
+    return stats
+
+
+def play_batched_games(lineup, nr_games, batch_size=100_000, rng=None, progress=False, stats=None,
+                       store=None):
+    """
+    Plays nr_games with BatchGame, returns the ScoreStats.
+    :param store: GameStore to append the details of every batch of games to
+    """
+    stats = ScoreStats() if stats is None else stats
+    for start in range(0, nr_games, batch_size):
+        stop = min(start + batch_size, nr_games)
+        batch = BatchGame(lineup, stop - start, rng=rng, details=store is not None)
+        batch.play()
+        stats.add_scores(batch.get_scores())
+        if store is not None:
+            store.append(batch.get_details())
+        if progress:
+            print(f"Played {stop} games")
+    return stats
+
+
+def play_inning_games(lineup, nr_games, batch_size=1_000_000, rng=None, progress=False, stats=None):
+    """ Samples nr_games from the cached inning distributions, returns the ScoreStats. """
+    stats = ScoreStats() if stats is None else stats
+    for start in range(0, nr_games, batch_size):
+        stop = min(start + batch_size, nr_games)
+        stats.add_scores(sample_scores(lineup, stop - start, rng=rng))
+        if progress:
+            print(f"Played {stop} games")
+    return stats
+
+
+def _play_shard(lineup, nr_games, batch_size, seed):
+    return play_games(lineup, nr_games, batch_size, np.random.default_rng(seed))
+
+
+def play_sharded_games(lineup, nr_games, workers, batch_size=None, seed=None):
+    """
+    Splits the games over a process pool, every worker gets its own random
+    number stream spawned from the seed.
+    :return: ScoreStats of all games
+    """
+    shards = [len(shard) for shard in np.array_split(np.arange(nr_games), workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shard_stats = list(pool.map(_play_shard, [lineup] * workers, shards,
+                                    [batch_size] * workers, seeds))
+    stats = ScoreStats()
+    for shard in shard_stats:
+        stats.merge(shard)
+    print(f"Played {nr_games} games on {workers} workers")
+    return stats
+
+
+def compute_exact_scores(lineup):
+    """ Same statistics as play_many_games, but exact instead of simulated. """
+    Game(lineup).print_lineup()
+    dist = exact_score_distribution(lineup)
+    print("\nThe exact score distribution is:")
+    print(f"avg score: \t{dist.mean():.4f}")
+    print(f"median: \t{dist.median()}")
+    print(f"std dev: \t{dist.std():.2f}")
+    for runs, prob in enumerate(dist.pmf[:dist.quantile(0.999) + 1]):
+        print(f"{runs:>3} runs: {prob:.4f}")
 
 
 def play_one_game(lineup):
@@ -90,10 +225,30 @@ def play_one_game(lineup):
 
 
 if __name__ == '__main__':
+    # from optimizer import optimize_lineup, print_results
+    # print_results(optimize_lineup(MLB_LINEUP_IDS, checkpoint='optimize.npz'))
+
     lineup = setup_mlb()
     # lineup = setup_own()
 
     # play_many_games(lineup, nr_games=10_000)
+    # from profiling import GameProfile
+    # play_many_games(lineup, nr_games=10_000, profile=GameProfile())
+    # play_many_games(lineup, nr_games=10_000_000, from_innings=True)
+    # from game_store import GameStore
+    # play_many_games(lineup, nr_games=1_000_000, store=GameStore('games/mlb', metadata={'lineup': MLB_LINEUP_IDS}))
+    # play_many_games(lineup, nr_games=1_000_000, batch_size=100_000)
+    # play_many_games(lineup, nr_games=10_000_000, batch_size=100_000, workers=32, seed=1)
+    # play_many_games(lineup, nr_games=10_000_000, target_stderr=0.01, confidence=0.95)
+    # from adaptive import compare_lineups
+    # print(compare_lineups(setup_mlb(), setup_own(), progress=True))
+    # compute_exact_scores(lineup)
+    # from matchups import Matchups
+    # matchups = Matchups(extra_innings=np.inf)
+    # matchups.add(setup_mlb(), 'mlb'); matchups.add(setup_own(), 'own')
+    # print(matchups.table())
+    # from sweep import grid, sweep
+    # print(sweep(lineup, grid(prob_double_play=[0.2, 0.4, 0.6], prob_steal_2nd_base=[0.0, 0.05, 0.2])))
     play_one_game(lineup)
 
 
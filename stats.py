@@ -0,0 +1,130 @@
+"""
+Constant-memory statistics of the scores of many games.
+
+ScoreStats keeps a histogram of the scores and a running mean and variance
+(Welford), instead of a list of all scores. Quantiles come from the histogram
+and are exact. Stats of separate runs can be merged.
+"""
+from statistics import NormalDist
+import numpy as np
+
+
+def z_value(confidence=None):
+    """ Half-width of a two-sided confidence interval in standard errors, 1 if None. """
+    if confidence is None:
+        return 1.0
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+class ScoreStats:
+    def __init__(self):
+        # counts[runs] is the number of games with that score
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.nr_games = 0
+        self.running_mean = 0.0
+        # sum of squared differences from the mean
+        self.m2 = 0.0
+
+    def add(self, score):
+        """ Adds the score of one game. """
+        if score >= len(self.counts):
+            self.grow(score + 1)
+        self.counts[score] += 1
+        self.nr_games += 1
+        delta = score - self.running_mean
+        self.running_mean += delta / self.nr_games
+        self.m2 += delta * (score - self.running_mean)
+
+    def add_scores(self, scores):
+        """ Adds the scores of many games, an array of ints. """
+        scores = np.asarray(scores)
+        if len(scores) == 0:
+            return
+        counts = np.bincount(scores)
+        batch = ScoreStats()
+        batch.counts = counts.astype(np.int64)
+        batch.nr_games = len(scores)
+        batch.running_mean = scores.mean()
+        batch.m2 = ((scores - batch.running_mean) ** 2).sum()
+        self.merge(batch)
+
+    def merge(self, other):
+        """ Adds all games of another ScoreStats to this one. """
+        if other.nr_games == 0:
+            return
+        if len(other.counts) > len(self.counts):
+            self.grow(len(other.counts))
+        self.counts[:len(other.counts)] += other.counts
+        total = self.nr_games + other.nr_games
+        delta = other.running_mean - self.running_mean
+        self.running_mean += delta * other.nr_games / total
+        self.m2 += other.m2 + delta ** 2 * self.nr_games * other.nr_games / total
+        self.nr_games = total
+
+    def grow(self, length):
+        counts = np.zeros(max(length, 2 * len(self.counts)), dtype=np.int64)
+        counts[:len(self.counts)] = self.counts
+        self.counts = counts
+
+    def mean(self):
+        return self.running_mean
+
+    def variance(self):
+        return self.m2 / self.nr_games if self.nr_games else 0.0
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def stderr(self):
+        """ Standard error of the mean score. """
+        if self.nr_games < 2:
+            return np.inf
+        return np.sqrt(self.m2 / (self.nr_games - 1) / self.nr_games)
+
+    def confidence_interval(self, confidence=0.95):
+        half_width = z_value(confidence) * self.stderr()
+        return self.mean() - half_width, self.mean() + half_width
+
+    def max(self):
+        return int(np.flatnonzero(self.counts)[-1]) if self.nr_games else 0
+
+    def quantile(self, q):
+        """ Same as np.quantile on the list of all scores (linear interpolation). """
+        cum_counts = np.cumsum(self.counts)
+        position = q * (self.nr_games - 1)
+        low = int(np.searchsorted(cum_counts, np.floor(position), side='right'))
+        high = int(np.searchsorted(cum_counts, np.ceil(position), side='right'))
+        return low + (high - low) * (position - np.floor(position))
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def to_dict(self):
+        """ The statistics as a dict, for json, stderr is None with less than 2 games. """
+        stderr = self.stderr()
+        return {
+            'nr_games': self.nr_games,
+            'mean': self.mean(),
+            'std': self.std(),
+            'stderr': float(stderr) if np.isfinite(stderr) else None,
+            'median': self.median(),
+            'counts': self.counts[:self.max() + 1].tolist(),
+        }
+
+    def report(self):
+        """ The statistics that play_many_games prints. """
+        return (f"avg score: \t{self.mean()}\n"
+                f"median: \t{self.median()}\n"
+                f"std dev: \t{self.std():.2f}")
+
+    def histogram(self, width=50):
+        """ Text histogram of the scores, one row per number of runs. """
+        counts = self.counts[:self.max() + 1]
+        most = max(counts.max(), 1) if len(counts) else 1
+        lasts = ['', '⠂', '⠆', '⠇', '⡇', '⡗', '⡷', '⡿']
+        lines = []
+        for runs, count in enumerate(counts):
+            height = int(width * 8 * count / most)
+            bar = '⣿' * (height // 8) + lasts[height % 8]
+            lines.append(f"{runs:>3} runs | {bar:<{width + 1}} {count}")
+        return "\n".join(lines)
@@ -0,0 +1,83 @@
+"""
+Sensitivity of the score of a lineup to the baserunning probabilities of Game.
+
+A sweep plays all points of a grid (or a Latin hypercube sample) of the Game
+parameters in the same BatchGames: every lane carries the index of its
+parameter set. The result is a table with one row per point.
+"""
+from itertools import product
+import numpy as np
+from batch import BatchGame
+from transitions import PARAM_NAMES
+
+
+def grid(**values):
+    """
+    All combinations of the given values, e.g.
+    grid(prob_double_play=[0.3, 0.4, 0.5], prob_steal_2nd_base=[0.0, 0.05])
+    :return: list of dicts with the Game parameters of every point
+    """
+    for name in values:
+        assert name in PARAM_NAMES, f"unknown Game parameter {name}"
+    names = list(values)
+    return [dict(zip(names, point)) for point in product(*values.values())]
+
+
+def latin_hypercube(ranges, nr_points, rng=None):
+    """
+    Latin hypercube sample: the range of every parameter is split in nr_points
+    equal parts, and every part is used by exactly one point.
+    :param ranges: dict of parameter name -> (low, high)
+    :return: list of dicts with the Game parameters of every point
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    columns = {}
+    for name, (low, high) in ranges.items():
+        assert name in PARAM_NAMES, f"unknown Game parameter {name}"
+        parts = rng.permutation(nr_points)
+        columns[name] = low + (high - low) * (parts + rng.random(nr_points)) / nr_points
+    return [{name: float(column[i]) for name, column in columns.items()} for i in range(nr_points)]
+
+
+def sweep(lineup, points, games_per_point=10_000, batch_size=1_000_000, rng=None, progress=False):
+    """
+    Plays games_per_point games for every parameter set.
+    :param points: list of dicts with (some of) the Game parameters, the
+                    others get their default values, see grid and latin_hypercube
+    :param batch_size: nr of lanes per BatchGame, with games of many points
+    :return: pandas DataFrame with the parameters of every point, and the
+                mean, std and standard error of the runs, and the nr of games
+    """
+    import pandas as pd
+    rng = np.random.default_rng() if rng is None else rng
+    nr_points = len(points)
+    total = np.zeros(nr_points)
+    total_sq = np.zeros(nr_points)
+    nr_games = np.zeros(nr_points, dtype=np.int64)
+
+    points_per_batch = max(1, batch_size // games_per_point)
+    for start in range(0, nr_points, points_per_batch):
+        chunk = points[start:start + points_per_batch]
+        played = 0
+        while played < games_per_point:
+            games = min(games_per_point - played, batch_size)
+            param_index = np.repeat(np.arange(len(chunk)), games)
+            batch = BatchGame(lineup, len(param_index), rng=rng,
+                              param_sets=chunk, param_index=param_index)
+            batch.play()
+            scores = batch.get_scores().astype(float)
+            total[start:start + len(chunk)] += np.bincount(param_index, scores, len(chunk))
+            total_sq[start:start + len(chunk)] += np.bincount(param_index, scores ** 2, len(chunk))
+            nr_games[start:start + len(chunk)] += games
+            played += games
+        if progress:
+            print(f"Played {min(start + points_per_batch, nr_points)} of {nr_points} points")
+
+    mean = total / nr_games
+    var = np.maximum(total_sq / nr_games - mean ** 2, 0) * nr_games / np.maximum(nr_games - 1, 1)
+    table = pd.DataFrame(points)
+    table['mean'] = mean
+    table['std'] = np.sqrt(var)
+    table['stderr'] = np.sqrt(var / nr_games)
+    table['nr_games'] = nr_games
+    return table
@@ -0,0 +1,29 @@
+import json
+import pytest
+import cli
+
+PROBS = [[0.15, 0.5, 0.15, 0.15, 0.045, 0.005, 0.0]] * 9
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_bad_lines_become_errors(tmp_path, workers):
+    lines = [
+        [1, 2],
+        {'id': 'bad-running', 'probs': PROBS, 'baserunning': [1, 2, 3, 4, 5, 6, 7, 8, 9]},
+        {'id': 'typo', 'probs': PROBS, 'baserunning': [{'prob_stel': 1}] + [None] * 8},
+        {'id': 'good', 'probs': PROBS, 'nr_games': 100, 'seed': 1},
+    ]
+    lineups = tmp_path / "lineups.jsonl"
+    lineups.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    output = tmp_path / "results.jsonl"
+    args = [str(lineups), '--output', str(output)]
+    if workers is not None:
+        args += ['--workers', str(workers)]
+    assert cli.main(args) == 0
+
+    results = {result['line']: result for result in map(json.loads, output.read_text().splitlines())}
+    assert sorted(results) == [1, 2, 3, 4]
+    for line_nr in (1, 2, 3):
+        assert results[line_nr]['error'].startswith('ValueError')
+    assert 'error' not in results[4]
+    assert results[4]['nr_games'] == 100
@@ -0,0 +1,459 @@
+"""
+The base/out state machine of the baseball Game, as transition tables.
+
+The 8 base configurations are encoded as a 3-bit integer (bit 0 = runner on
+1st, bit 1 = 2nd, bit 2 = 3rd). Every event (the seven batter outcomes and the
+steal attempts before a plate appearance) is written down once below as a rule
+that moves the runners, and compiled into a table: for every (outs, bases) a
+list of branches (next bases, runs scored, outs added, probability).
+
+Some probabilities can also depend on which runner it is (RUNNER_PARAMS, e.g.
+a fast runner steals more often). The branches know which runner every such
+decision is about, and build_runner_cum_probs fills in the probabilities for
+every combination of runners on base, identified by their index in the lineup.
+"""
+from functools import lru_cache
+import numpy as np
+
+EMPTY, FIRST, SECOND, THIRD = 0, 1, 2, 4
+
+# event codes, the batter outcomes are in the same order as Batter.options
+STRIKE_OUT, IN_PLAY_OUT, WALK, SINGLE, DOUBLE, TRIPLE, HOMERUN, STEAL = range(8)
+NR_EVENTS = 8
+
+# where a runner (or the batter) ends up, 0 is out
+OUT, HOME = 0, 4
+BATTER = 0
+
+PARAM_NAMES = (
+    'prob_advance_runner_on_out',
+    'prob_double_play',
+    'prob_steal_2nd_base',
+    'prob_steal_3rd_base',
+    'prob_steal_home',
+    'prob_1st_to_3rd',
+    'prob_score_from_2nd_on_single',
+    'prob_score_from_1st_on_double',
+)
+
+# the parameters that can be different for every runner, see Batter.baserunning
+RUNNER_PARAMS = (
+    'prob_steal_2nd_base',
+    'prob_steal_3rd_base',
+    'prob_steal_home',
+    'prob_1st_to_3rd',
+    'prob_score_from_2nd_on_single',
+    'prob_score_from_1st_on_double',
+)
+
+DEFAULT_PARAMS = {
+    'prob_advance_runner_on_out': 0.2,
+    'prob_double_play': 0.4,
+    'prob_steal_2nd_base': 0.05,
+    'prob_steal_3rd_base': 0.01,
+    'prob_steal_home': 0.001,
+    'prob_1st_to_3rd': 0.2,
+    'prob_score_from_2nd_on_single': 0.5,
+    'prob_score_from_1st_on_double': 0.3,
+}
+
+
+def state_index(outs, bases):
+    """ Base/out state as one number, 24 and up means three outs. """
+    return outs * 8 + bases
+
+
+NR_STATES = 24
+
+# runners on base are identified by their index in the lineup, an empty base
+# has NO_RUNNER. The runners on (1st, 2nd, 3rd) as one number:
+# runner_combo(r1, r2, r3) = r1 * 100 + r2 * 10 + r3
+NO_RUNNER = 9
+NR_RUNNER_COMBOS = 1000
+
+
+def runner_combo(runner_1st, runner_2nd, runner_3rd):
+    return runner_1st * 100 + runner_2nd * 10 + runner_3rd
+
+
+class _NeedDecision(Exception):
+    def __init__(self, nr_options):
+        super().__init__()
+        self.nr_options = nr_options
+
+
+class Play:
+    """
+    One path through a rule. The rule asks for random decisions with pick(),
+    the answers are given up front so that all paths can be enumerated.
+    """
+    def __init__(self, bases, outs, decisions):
+        self.outs = outs
+        # which runner is where: base number -> where the runner came from
+        self.on_base = {base: base for base in (1, 2, 3) if bases & (1 << (base - 1))}
+        self.moves = {base: base for base in self.on_base}
+        self.decisions = decisions
+        self.factors = []
+        self.notes = []
+        self.kinds = []
+
+    def pick(self, names, base=None):
+        """
+        Random choice between the events with the given probabilities
+        :param base: the base of the runner the probabilities are about, if
+                        they depend on the runner
+        :return: index of the chosen name, or None if none of them happens
+        """
+        i = len(self.factors)
+        if i == len(self.decisions):
+            raise _NeedDecision(len(names) + 1)
+        choice = self.decisions[i]
+        # the runner by the base he stood on when the play started
+        runner = None if base is None else self.on_base[base]
+        self.factors.append((tuple(names), choice, runner))
+        return choice
+
+    def draw(self, name, base=None):
+        return self.pick((name,), base) == 0
+
+    def occupied(self, base):
+        return base in self.on_base
+
+    def runners(self):
+        return len(self.on_base)
+
+    def move(self, base, to):
+        """ Move the runner on base (if any) to another base, OUT or HOME. """
+        if base not in self.on_base:
+            return
+        runner = self.on_base.pop(base)
+        self.moves[runner] = to
+        if 1 <= to <= 3:
+            self.on_base[to] = runner
+
+    def batter_to(self, to):
+        self.moves[BATTER] = to
+        if 1 <= to <= 3:
+            self.on_base[to] = BATTER
+
+    def note(self, text, kind):
+        """
+        :param text: what Game prints
+        :param kind: name of what happened, e.g. 'double_play'
+        """
+        self.notes.append(text)
+        self.kinds.append(kind)
+
+
+class Branch:
+    def __init__(self, play):
+        self.factors = tuple(play.factors)
+        self.notes = tuple(play.notes)
+        self.kinds = tuple(play.kinds)
+        # destination of (batter, runner on 1st, 2nd, 3rd), -1 if not on the
+        # field (or, for the batter, still at the plate)
+        self.moves = tuple(play.moves.get(runner, -1) for runner in range(4))
+        self.next_bases = sum(1 << (base - 1) for base in play.on_base)
+        self.runs = sum(to == HOME for to in self.moves)
+        self.outs_added = sum(to == OUT for to in self.moves)
+        # who is on (1st, 2nd, 3rd) afterwards: BATTER, the base the runner
+        # came from, or -1 if empty
+        self.sources = tuple(play.on_base.get(base, -1) for base in (1, 2, 3))
+        # False if everybody on base stayed where he was
+        self.moves_runners = self.sources != tuple(base if base in play.moves else -1 for base in (1, 2, 3))
+
+    def probability(self, params):
+        prob = 1.0
+        for names, choice, _ in self.factors:
+            prob *= self.probability_of_factor(names, choice, params)
+        return prob
+
+    @staticmethod
+    def probability_of_factor(names, choice, params):
+        if choice is None:
+            return 1.0 - sum(params[name] for name in names)
+        return params[names[choice]]
+
+
+# the rules, ported from the event methods of the original Game
+
+def strike_out(play):
+    play.note("Strike-out.", 'strike_out')
+    play.batter_to(OUT)
+
+
+def in_play_out(play):
+    play.note("Ball in play, out.", 'in_play_out')
+    play.batter_to(OUT)
+    if play.runners() > 0 and play.outs + 1 < 3:
+        choice = play.pick(('prob_advance_runner_on_out', 'prob_double_play'))
+        if choice == 0:
+            sac_fly_or_bunt(play)
+        elif choice == 1:
+            double_play(play)
+
+
+def sac_fly_or_bunt(play):
+    play.note("Runner(s) advance(s) on the play.", 'sac_fly_or_bunt')
+    play.move(3, HOME)
+    play.move(2, 3)
+    play.move(1, 2)
+
+
+def double_play(play):
+    play.note("Double play!", 'double_play')
+    if play.runners() == 3:
+        # bases loaded, dp over home and 1st
+        play.move(3, OUT)
+        play.move(2, 3)
+        play.move(1, 2)
+    elif play.occupied(1):
+        # dp over 2nd and 1st, runner on 3rd scores unless that was the third out
+        if play.outs + 2 < 3:
+            play.move(3, HOME)
+        play.move(1, OUT)
+        play.move(2, 3)
+    elif play.occupied(3):
+        # sac fly, out at home
+        play.move(3, OUT)
+    else:
+        # sac fly, out at 3rd
+        play.move(2, OUT)
+
+
+def walk(play):
+    play.note("Walk.", 'walk')
+    # runners only move up when forced
+    if play.occupied(1):
+        if play.occupied(2):
+            play.move(3, HOME)
+            play.move(2, 3)
+        play.move(1, 2)
+    play.batter_to(1)
+
+
+def single(play):
+    play.note("Hits a single.", 'single')
+    play.move(3, HOME)
+    if play.occupied(2):
+        play.move(2, HOME if play.draw('prob_score_from_2nd_on_single', base=2) else 3)
+    # runner on 1st can only go to 3rd if it is free
+    if play.occupied(1):
+        play.move(1, 3 if not play.occupied(3) and play.draw('prob_1st_to_3rd', base=1) else 2)
+    play.batter_to(1)
+
+
+def double(play):
+    play.note("Hits a double!", 'double')
+    play.move(3, HOME)
+    play.move(2, HOME)
+    if play.occupied(1):
+        play.move(1, HOME if play.draw('prob_score_from_1st_on_double', base=1) else 3)
+    play.batter_to(2)
+
+
+def triple(play):
+    play.note("Hits a triple!", 'triple')
+    for base in (3, 2, 1):
+        play.move(base, HOME)
+    play.batter_to(3)
+
+
+def homerun(play):
+    play.note("Hits a home-run!", 'homerun')
+    for base in (3, 2, 1):
+        play.move(base, HOME)
+    play.batter_to(HOME)
+
+
+def steal(play):
+    if play.occupied(1) and not play.occupied(2):
+        if play.draw('prob_steal_2nd_base', base=1):
+            play.move(1, 2)
+            play.note("Steal! Runner on 2nd base now.", 'steal_2nd')
+    if play.occupied(2) and not play.occupied(3):
+        if play.draw('prob_steal_3rd_base', base=2):
+            play.move(2, 3)
+            if play.occupied(1):
+                play.move(1, 2)
+                play.note("Double steal! Runners on 2nd and 3rd now.", 'double_steal')
+            else:
+                play.note("Steal! Runner on 3rd base now.", 'steal_3rd')
+    if play.occupied(3):
+        if play.draw('prob_steal_home', base=3):
+            play.move(3, HOME)
+            play.note("Steal home! Run scored!", 'steal_home')
+
+
+RULES = (strike_out, in_play_out, walk, single, double, triple, homerun, steal)
+
+
+def enumerate_branches(rule, bases, outs):
+    """ All possible outcomes of a rule in the given state. """
+    branches = []
+    todo = [()]
+    while todo:
+        decisions = todo.pop()
+        play = Play(bases, outs, decisions)
+        try:
+            rule(play)
+        except _NeedDecision as need:
+            options = list(range(need.nr_options - 1)) + [None]
+            todo.extend(decisions + (option,) for option in reversed(options))
+            continue
+        branches.append(Branch(play))
+    return branches
+
+
+# BRANCHES[event][outs][bases], the structure does not depend on the parameters
+BRANCHES = [[[enumerate_branches(rule, bases, outs) for bases in range(8)]
+             for outs in range(3)]
+            for rule in RULES]
+MAX_BRANCHES = max(len(branches) for event in BRANCHES for row in event for branches in row)
+
+
+def build_table(params):
+    """
+    Fills in the branch probabilities for the given Game parameters.
+    :param params: dict with a value for each name in PARAM_NAMES
+    :return: table[event][outs][bases] = (cumulative probs, branches)
+    """
+    table = []
+    for event in BRANCHES:
+        table.append([])
+        for row in event:
+            table[-1].append([])
+            for branches in row:
+                probs = np.array([branch.probability(params) for branch in branches])
+                table[-1][-1].append((tuple(np.cumsum(probs)), tuple(branches)))
+    return table
+
+
+@lru_cache(maxsize=64)
+def cached_table(params):
+    """
+    build_table, cached by the parameters, so that a new Game does not build
+    it again. The table is shared between Games, so it is made of tuples.
+    :param params: tuple of (name, value) of all parameters
+    """
+    return tuple(tuple(tuple(row) for row in event) for event in build_table(dict(params)))
+
+
+def get_table(params):
+    """ Same as build_table, but cached, see cached_table. """
+    return cached_table(tuple(sorted(params.items())))
+
+
+def build_arrays(params):
+    """
+    The same table as NumPy arrays, padded to MAX_BRANCHES branches. Row
+    event * NR_STATES + state_index(outs, bases) holds the branches of that
+    event in that state.
+    :return: dict with cum_probs, next_state, runs and outs_added,
+                each of shape (NR_EVENTS * NR_STATES, MAX_BRANCHES), and
+                sources of shape (NR_EVENTS * NR_STATES, MAX_BRANCHES, 3)
+    """
+    shape = (NR_EVENTS * NR_STATES, MAX_BRANCHES)
+    arrays = {
+        'cum_probs': np.ones(shape),
+        'next_state': np.zeros(shape, dtype=np.intp),
+        'runs': np.zeros(shape, dtype=np.int8),
+        'outs_added': np.zeros(shape, dtype=np.int8),
+        'sources': np.zeros(shape + (3,), dtype=np.intp),
+    }
+    for event, rows in enumerate(build_table(params)):
+        for outs, row in enumerate(rows):
+            for bases, (cum_probs, branches) in enumerate(row):
+                i = event * NR_STATES + state_index(outs, bases)
+                for k in range(MAX_BRANCHES):
+                    # padding repeats the last branch, which takes the rest of
+                    # the probability so that rounding can never fall off the end
+                    branch = branches[min(k, len(branches) - 1)]
+                    if k < len(branches) - 1:
+                        arrays['cum_probs'][i, k] = cum_probs[k]
+                    next_outs = min(outs + branch.outs_added, 3)
+                    arrays['next_state'][i, k] = state_index(next_outs, branch.next_bases if next_outs < 3 else EMPTY)
+                    arrays['runs'][i, k] = branch.runs
+                    arrays['outs_added'][i, k] = branch.outs_added
+                    arrays['sources'][i, k] = branch.sources
+    return arrays
+
+
+def lineup_runner_params(lineup, params):
+    """
+    :param params: dict with the Game value of each name in RUNNER_PARAMS
+    :return: dict with for each name in RUNNER_PARAMS a list with the value of
+                every batter of the lineup as a runner
+    """
+    return {name: [batter.baserunning.get(name, params[name]) for batter in lineup]
+            for name in RUNNER_PARAMS}
+
+
+@lru_cache(maxsize=8)
+def cached_runner_cum_probs(params, runner_params):
+    """
+    build_runner_cum_probs, cached by the parameters, read-only as it is
+    shared between Games.
+    :param params: tuple of (name, value) of all parameters
+    :param runner_params: tuple of (name, tuple with the value of every batter)
+    """
+    cum_probs = build_runner_cum_probs(dict(params), {name: list(values) for name, values in runner_params})
+    cum_probs.setflags(write=False)
+    return cum_probs
+
+
+@lru_cache(maxsize=8)
+def cached_runner_cum_prob_lists(params, runner_params):
+    """ The same as nested lists, faster to look up one row at a time, do not change them. """
+    return cached_runner_cum_probs(params, runner_params).tolist()
+
+
+def get_runner_cum_probs(lineup, params, as_lists=False):
+    """
+    build_runner_cum_probs of a lineup, cached by the parameters and the
+    baserunning of every batter.
+    :param params: dict with a value for each name in PARAM_NAMES
+    :param as_lists: rows as lists, for Game, instead of an array
+    """
+    runner_params = lineup_runner_params(lineup, params)
+    key = (tuple(sorted(params.items())),
+           tuple((name, tuple(float(value) for value in values)) for name, values in runner_params.items()))
+    return cached_runner_cum_prob_lists(*key) if as_lists else cached_runner_cum_probs(*key)
+
+
+def build_runner_cum_probs(params, runner_params):
+    """
+    The cum_probs of build_arrays for every combination of runners on base.
+    :param params: dict with a value for each name in PARAM_NAMES
+    :param runner_params: dict with for each name in RUNNER_PARAMS an array
+                            with its value for every index in the lineup
+    :return: array of shape (NR_RUNNER_COMBOS * NR_EVENTS * NR_STATES,
+                MAX_BRANCHES), row (runner_combo * NR_EVENTS + event) *
+                NR_STATES + state_index(outs, bases)
+    """
+    combos = np.arange(NR_RUNNER_COMBOS)
+    # the lineup index of the runner on each base, by base number
+    runners = {1: combos // 100, 2: combos // 10 % 10, 3: combos % 10}
+    values = {}
+    for name in RUNNER_PARAMS:
+        value = np.full(NO_RUNNER + 1, params[name], dtype=float)
+        value[:len(runner_params[name])] = runner_params[name]
+        values[name] = value
+
+    cum_probs = np.ones((NR_RUNNER_COMBOS, NR_EVENTS * NR_STATES, MAX_BRANCHES))
+    for event, rows in enumerate(BRANCHES):
+        for outs, row in enumerate(rows):
+            for bases, branches in enumerate(row):
+                i = event * NR_STATES + state_index(outs, bases)
+                total = np.zeros(NR_RUNNER_COMBOS)
+                for k, branch in enumerate(branches[:-1]):
+                    prob = np.ones(NR_RUNNER_COMBOS)
+                    for names, choice, runner in branch.factors:
+                        if runner is None:
+                            prob *= Branch.probability_of_factor(names, choice, params)
+                        else:
+                            p = values[names[0]][runners[runner]]
+                            prob *= p if choice == 0 else 1.0 - p
+                    total += prob
+                    cum_probs[:, i, k] = total
+    return cum_probs.reshape(-1, MAX_BRANCHES)